@@ -8,6 +8,7 @@ from functools import wraps
 import werkzeug.datastructures
 import logging
 from config.celery_config import celery_app
+from config import query_budget
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,10 +22,14 @@ from routes.auth import auth_bp
 from routes.loan_applications import loan_app_bp
 from routes.loans import loan_bp
 from routes.payments import payment_bp
+from routes.metrics import metrics_bp
 
 app = Flask(__name__)
 celery_app.conf.update(app.config)
 
+# Count queries per request and flag N+1 patterns (DB_QUERY_BUDGET_MODE)
+query_budget.init_app(app)
+
 # CORS configuration with more specific settings
 CORS(app, 
      resources={r"/*": {
@@ -202,6 +207,7 @@ app.register_blueprint(auth_bp, url_prefix='/api/v1/auth')
 app.register_blueprint(loan_app_bp, url_prefix='/api/v1/loan-applications')
 app.register_blueprint(loan_bp, url_prefix='/api/v1/loans')
 app.register_blueprint(payment_bp, url_prefix='/api/v1/payments')
+app.register_blueprint(metrics_bp, url_prefix='/metrics')
 
 @app.route('/')
 def hello():
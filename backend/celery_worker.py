@@ -12,6 +12,7 @@ load_dotenv()
 
 # Importar tareas para asegurarnos de que se registren
 import tasks.ach_processor
+import tasks.maintenance
 
 if __name__ == '__main__':
     logger.info("Iniciando worker de Celery para procesamiento ACH...")
@@ -2,6 +2,7 @@ from celery import Celery
 from celery.schedules import crontab
 import os
 from dotenv import load_dotenv
+from config.query_budget import init_celery as init_query_budget
 
 # Cargar variables de entorno
 load_dotenv()
@@ -15,7 +16,7 @@ celery_app = Celery(
     'loan_platform',
     broker=CELERY_BROKER_URL,
     backend=CELERY_RESULT_BACKEND,
-    include=['tasks.ach_processor']
+    include=['tasks.ach_processor', 'tasks.maintenance']
 )
 
 # Configurar la zona horaria
@@ -27,6 +28,26 @@ celery_app.conf.beat_schedule = {
         'task': 'tasks.ach_processor.generate_daily_ach_file',
         'schedule': crontab(hour=11, minute=0),  # Todos los días a las 11:00 AM
     },
+    'settle-ach-batches-daily': {
+        'task': 'tasks.ach_processor.settle_ach_batches',
+        'schedule': crontab(hour=10, minute=0),  # Todos los días a las 10:00 AM, antes del nuevo lote
+    },
+    'extend-payment-schedules-daily': {
+        'task': 'tasks.maintenance.extend_payment_schedules',
+        'schedule': crontab(hour=1, minute=0),  # Todos los días a la 1:00 AM, antes del lote ACH
+    },
+    'snapshot-loan-balances-hourly': {
+        'task': 'tasks.maintenance.snapshot_loan_balances',
+        'schedule': crontab(minute=15),  # Cada hora, a los 15 minutos
+    },
+    'maintain-payment-partitions-daily': {
+        'task': 'tasks.maintenance.maintain_payment_partitions',
+        'schedule': crontab(hour=3, minute=30),  # Todos los días a las 3:30 AM, fuera del horario de ACH
+    },
+    'archive-settled-payments-daily': {
+        'task': 'tasks.maintenance.archive_settled_payments',
+        'schedule': crontab(hour=4, minute=0),  # Todos los días a las 4:00 AM
+    },
 }
 
 # Otras configuraciones
@@ -35,4 +56,7 @@ celery_app.conf.update(
     accept_content=['json'],
     result_serializer='json',
     enable_utc=True,
-) 
\ No newline at end of file
+) 
+
+# Contar las consultas por tarea y advertir de patrones N+1 (DB_QUERY_BUDGET_MODE)
+init_query_budget(celery_app)
@@ -1,164 +1,815 @@
 import mysql.connector
 import os
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import logging
+from config.query_stats import registry as query_stats, slow_query_log
+from config.db_backends import DB_BACKEND, DB_SQLITE_PATH, MySQLBackend, get_backend
+from config import query_budget
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('slow_query')
+
+# Statements EXPLAIN can describe
+EXPLAINABLE_PREFIXES = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')
 
 # Load environment variables
 load_dotenv()
 
-class Database:
-    def __init__(self):
-        self.config = {
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'user': os.getenv('DB_USER', ''),
-            'password': os.getenv('DB_PASSWORD', ''),
-            'database': os.getenv('DB_NAME', 'loan_tracker'),
-            'autocommit': True,  # Enable autocommit
-            'consume_results': True  # Automatically consume all results
+# Connection pool configuration
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))  # Max connection age in seconds
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+DB_POOL_PING_INTERVAL = float(os.getenv('DB_POOL_PING_INTERVAL', 30))  # Only ping connections idle longer than this
+
+# Read replicas, as a comma-separated list of host or host:port
+DB_REPLICA_HOSTS = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+
+# Server-side prepared statements kept open per connection
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 32))
+
+# Rows per statement for bulk writes
+DB_BULK_CHUNK_SIZE = int(os.getenv('DB_BULK_CHUNK_SIZE', 1000))
+
+# Rows fetched per round trip when streaming results
+DB_STREAM_CHUNK_SIZE = int(os.getenv('DB_STREAM_CHUNK_SIZE', 500))
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections shared by every Database
+    instance with the same connection settings.
+    """
+
+    def __init__(self, config, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 recycle=DB_POOL_RECYCLE, pre_ping=DB_POOL_PRE_PING,
+                 ping_interval=DB_POOL_PING_INTERVAL, backend=None):
+        self.config = config
+        self.backend = backend or MySQLBackend()
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.ping_interval = ping_interval
+        self._lock = threading.Lock()
+        self._reset_state()
+
+    def _reset_state(self):
+        # Per-thread transaction pinned to one connection (see Database.transaction)
+        self._local = threading.local()
+        # Idle connections are kept as (connection, created_at, last_used_at)
+        self._idle = deque()
+        self._created_at = {}
+        # Prepared statement cursors per connection, keyed by SQL text (see prepared_cursor)
+        self._statements = {}
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._pid = os.getpid()
+        self._stats = {
+            'connections_created': 0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'checkins': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'recycled': 0,
+            'ping_failures': 0,
+            'statements_prepared': 0,
+            'statement_cache_hits': 0,
         }
-        logger.info(f"Database config: host={self.config['host']}, user={self.config['user']}, database={self.config['database']}")
-        self.connection = None
-        
+
+    def _check_fork(self):
+        # Connections opened before a fork (e.g. Celery prefork workers) share
+        # sockets with the parent, so a child process starts with a fresh pool.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    logger.info("Process fork detected, resetting connection pool")
+                    self._reset_state()
+
+    def _open(self):
+        logger.info(f"Connecting to {self.backend.name} database...")
+        connection = self.backend.connect(self.config)
+        with self._lock:
+            self._created_at[id(connection)] = time.monotonic()
+            self._stats['connections_created'] += 1
+        logger.info(f"Connected to {self.backend.name} database successfully")
+        return connection
+
+    def _discard(self, connection):
+        with self._lock:
+            self._created_at.pop(id(connection), None)
+            # Server-side statements die with the connection
+            self._statements.pop(id(connection), None)
+            self._stats['connections_closed'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, connection, created_at, last_used_at):
+        now = time.monotonic()
+        if self.recycle and now - created_at > self.recycle:
+            with self._lock:
+                self._stats['recycled'] += 1
+            return False
+        if self.pre_ping and now - last_used_at > self.ping_interval:
+            try:
+                connection.ping(reconnect=False)
+            except Exception:
+                with self._lock:
+                    self._stats['ping_failures'] += 1
+                return False
+        return True
+
+    def checkout(self):
+        """Borrow a connection, waiting up to `timeout` seconds for a free slot"""
+        self._check_fork()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['waits'] += 1
+            if not slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise mysql.connector.errors.PoolError(
+                    f"Timed out after {self.timeout}s waiting for a database connection"
+                )
+
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    connection = self._open()
+                    break
+                connection, created_at, last_used_at = entry
+                if self._is_usable(connection, created_at, last_used_at):
+                    break
+                self._discard(connection)
+        except Exception:
+            slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+        return connection
+
+    def checkin(self, connection, discard=False):
+        """Return a borrowed connection to the pool"""
+        if self._pid != os.getpid():
+            # Connection belongs to the parent's pool; drop it without closing the shared socket
+            return
+        # Dead connections are flagged by the caller (discard) or caught by the pre-ping
+        # and recycle checks on checkout, so checkin costs no round trip
+        try:
+            if not discard and connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            discard = True
+
+        if discard:
+            self._discard(connection)
+        else:
+            with self._lock:
+                created_at = self._created_at.get(id(connection), time.monotonic())
+                self._idle.append((connection, created_at, time.monotonic()))
+        with self._lock:
+            self._stats['checkins'] += 1
+        self._slots.release()
+
+    def prepared_cursor(self, connection, query):
+        """
+        Return (sql, cursor) for a prepared statement cached on this connection.
+        The cursor keeps its server-side statement between calls; re-executing it
+        with the same sql object skips the prepare round trip.
+        """
+        with self._lock:
+            cache = self._statements.setdefault(id(connection), OrderedDict())
+            entry = cache.get(query)
+            if entry is not None:
+                cache.move_to_end(query)
+                self._stats['statement_cache_hits'] += 1
+                return entry
+            evicted = cache.popitem(last=False)[1] if len(cache) >= DB_STATEMENT_CACHE_SIZE else None
+            self._stats['statements_prepared'] += 1
+
+        if evicted is not None:
+            try:
+                evicted[1].close()
+            except Exception:
+                pass
+        entry = (query, connection.cursor(prepared=True, dictionary=True))
+        with self._lock:
+            self._statements.setdefault(id(connection), OrderedDict())[query] = entry
+        return entry
+
+    def forget_prepared(self, connection, query):
+        with self._lock:
+            entry = self._statements.get(id(connection), {}).pop(query, None)
+        if entry is not None:
+            try:
+                entry[1].close()
+            except Exception:
+                pass
+
+    def current_transaction(self):
+        self._check_fork()
+        return getattr(self._local, 'transaction', None)
+
+    def pin_transaction(self, transaction):
+        self._local.transaction = transaction
+
+    def dispose(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for connection, _, _ in idle:
+            self._discard(connection)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['idle'] = len(self._idle)
+            stats['open'] = len(self._created_at)
+            stats['checked_out'] = len(self._created_at) - len(self._idle)
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def all_pool_stats():
+    """Stats for every pool opened by this process, keyed by host/database"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.backend.pool_name(pool.config): pool.stats() for pool in pools}
+
+
+def get_pool(config, backend=None):
+    """Return the process-wide pool for the given connection settings"""
+    backend = backend or MySQLBackend()
+    key = backend.pool_key(config)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(config, backend=backend)
+            _pools[key] = pool
+        return pool
+
+
+# Per-thread routing state shared by every Database instance
+_routing = threading.local()
+
+
+@contextmanager
+def read_your_writes():
+    """
+    Send reads to the primary while the block runs, so a read that follows a
+    write in the same thread sees it even if the replicas lag. Also usable as
+    a decorator: @read_your_writes()
+    """
+    _routing.primary_reads = getattr(_routing, 'primary_reads', 0) + 1
+    try:
+        yield
+    finally:
+        _routing.primary_reads -= 1
+
+
+class Transaction:
+    """
+    A transaction pinned to one pooled connection for the current thread.
+    Any statement that fails inside it marks it failed, and a failed
+    transaction is rolled back instead of committed.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.depth = 1
+        self.failed = False
+        self.error = None
+
+    def fail(self, error):
+        if not self.failed:
+            self.failed = True
+            self.error = str(error)
+
+
+class QueryResult:
+    """
+    Detached result of execute_query. The pooled connection has already been
+    returned, so rows are buffered and only the cursor-like parts remain.
+    """
+
+    def __init__(self, cursor):
+        self._rows = deque(cursor.fetchall() if cursor.with_rows else [])
+        self.rowcount = cursor.rowcount
+        self.lastrowid = cursor.lastrowid
+
+    def fetchone(self):
+        return self._rows.popleft() if self._rows else None
+
+    def fetchall(self):
+        rows = list(self._rows)
+        self._rows.clear()
+        return rows
+
+    def close(self):
+        self._rows.clear()
+
+
+def _call_site():
+    """The innermost frame outside this module and contextlib, e.g. the model method"""
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        if frame.filename != __file__ and not frame.filename.endswith('contextlib.py'):
+            return f"{os.path.relpath(frame.filename)}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+
+class Database:
+    def __init__(self, backend=None):
+        # DB_BACKEND=sqlite runs the same models against a local file, for offline benchmarks
+        self.backend = get_backend(backend or DB_BACKEND)
+        if self.backend.name == 'sqlite':
+            self.config = {'database': DB_SQLITE_PATH}
+            logger.info(f"Database config: sqlite database={self.config['database']}")
+        else:
+            self.config = {
+                'host': os.getenv('DB_HOST', 'localhost'),
+                'user': os.getenv('DB_USER', ''),
+                'password': os.getenv('DB_PASSWORD', ''),
+                'database': os.getenv('DB_NAME', 'loan_tracker'),
+                'autocommit': True,  # Enable autocommit
+                'consume_results': True  # Automatically consume all results
+            }
+            logger.info(f"Database config: host={self.config['host']}, user={self.config['user']}, database={self.config['database']}")
+        self.pool = get_pool(self.config, self.backend)
+        replica_hosts = DB_REPLICA_HOSTS if self.backend.supports_replicas else []
+        self.replica_pools = [get_pool(self._replica_config(host), self.backend) for host in replica_hosts]
+        self._next_replica = 0
+
+    @property
+    def dialect(self):
+        """SQL dialect of the backend, 'mysql' or 'sqlite', for the few statements that differ"""
+        return self.backend.name
+
+    def _replica_config(self, host):
+        config = dict(self.config)
+        if ':' in host:
+            host, port = host.rsplit(':', 1)
+            config['port'] = int(port)
+        config['host'] = host
+        return config
+
+    def _read_pool(self):
+        """
+        Pick the pool for a read. Reads go to a replica unless none are
+        configured, a transaction is open on this thread, or the thread is
+        inside read_your_writes().
+        """
+        if not self.replica_pools or getattr(_routing, 'primary_reads', 0):
+            return self.pool
+        if self.pool.current_transaction() is not None:
+            return self.pool
+        # Round-robin; the race on the counter only affects balance, not correctness
+        self._next_replica = (self._next_replica + 1) % len(self.replica_pools)
+        return self.replica_pools[self._next_replica]
+
+    def _checkout(self, pool):
+        """Check out from pool, falling back to the primary if a replica is unavailable"""
+        try:
+            return pool, pool.checkout()
+        except self.backend.Error as e:
+            if pool is self.pool:
+                raise
+            logger.warning(f"Replica unavailable, reading from primary: {e}")
+            return self.pool, self.pool.checkout()
+
     def connect(self):
+        """Check out a pooled connection. Callers must hand it back with release()"""
         try:
-            if self.connection is None or not self.connection.is_connected():
-                logger.info("Connecting to MySQL database...")
-                self.connection = mysql.connector.connect(**self.config)
-                logger.info("Connected to MySQL database successfully")
-            return self.connection
-        except mysql.connector.Error as e:
-            logger.error(f"Error connecting to MySQL: {e}")
-            self.connection = None
+            return self.pool.checkout()
+        except self.backend.Error as e:
+            logger.error(f"Error connecting to database: {e}")
             return None
-            
+
+    def release(self, connection):
+        if connection:
+            self.pool.checkin(connection)
+
     def close(self):
-        if self.connection and self.connection.is_connected():
-            logger.info("Closing database connection")
-            self.connection.close()
-            self.connection = None
-    
-    def reconnect(self):
-        """Force reconnection to database"""
-        self.close()
-        return self.connect()
-            
-    def execute_query(self, query, params=None):
-        connection = None
-        cursor = None
+        """Close the idle connections held by the shared pool"""
+        logger.info("Closing idle database connections")
+        self.pool.dispose()
+        for pool in self.replica_pools:
+            pool.dispose()
+
+    def pool_stats(self):
+        stats = self.pool.stats()
+        if self.replica_pools:
+            stats['replicas'] = [pool.stats() for pool in self.replica_pools]
+        return stats
+
+    def in_transaction(self):
+        return self.pool.current_transaction() is not None
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run every statement issued by this thread inside the block on one
+        connection and commit once at the end. Rolls back if the block raises
+        or any statement inside it fails. Nested blocks join the outer
+        transaction.
+        """
+        txn = self.pool.current_transaction()
+        if txn:
+            txn.depth += 1
+            try:
+                yield txn
+            except Exception as e:
+                txn.fail(e)
+                raise
+            finally:
+                txn.depth -= 1
+            return
+
+        connection = self.pool.checkout()
+        broken = False
+        try:
+            connection.start_transaction()
+        except Exception:
+            self.pool.checkin(connection, discard=True)
+            raise
+
+        txn = Transaction(connection)
+        self.pool.pin_transaction(txn)
         try:
-            connection = self.connect()
-            if not connection:
-                logger.error("Failed to connect to database")
+            yield txn
+        except Exception as e:
+            txn.fail(e)
+            raise
+        finally:
+            self.pool.pin_transaction(None)
+            try:
+                if txn.failed:
+                    logger.warning(f"Rolling back transaction: {txn.error}")
+                    connection.rollback()
+                else:
+                    connection.commit()
+            except self.backend.Error as e:
+                logger.error(f"Error finishing transaction: {e}")
+                txn.fail(e)
+                broken = True
+            finally:
+                self.pool.checkin(connection, discard=broken)
+
+    def _execute(self, query, params, handler, many=False, prepared=False, read=False):
+        """
+        Run a statement on a pooled connection and pass the open cursor to
+        handler. The connection is returned to the pool before this returns.
+        With prepared=True the statement runs as a server-side prepared
+        statement cached on the connection. Reads (read=True) may be routed
+        to a replica.
+        """
+        txn = self.pool.current_transaction()
+        pool = self.pool
+        if txn:
+            if txn.failed:
+                logger.warning("Skipping query: the current transaction has already failed")
                 return None
-                
-            cursor = connection.cursor(dictionary=True)
-            
-            # Log query for debugging (strip to avoid logging huge queries)
-            log_query = query
-            if len(log_query) > 200:
-                log_query = log_query[:200] + "..."
-            
-            if params:
-                logger.info(f"Executing query: {log_query} with params: {params}")
+            connection = txn.connection
+        else:
+            try:
+                pool, connection = self._checkout(self._read_pool() if read else self.pool)
+            except self.backend.Error as e:
+                logger.error(f"Failed to connect to database: {e}")
+                return None
+
+        cursor = None
+        broken = False
+        error = None
+        rows = 0
+        elapsed_ms = None
+        query_budget.record(query)
+        started = time.perf_counter()
+        try:
+            if prepared:
+                query, cursor = pool.prepared_cursor(connection, query)
+            else:
+                cursor = connection.cursor(dictionary=True)
+
+            # Per-query logging is debug-only; timings and row counts go to the query stats registry
+            if logger.isEnabledFor(logging.DEBUG):
+                self._log_query(query, params, many)
+
+            if many:
+                cursor.executemany(query, params)
+            elif params:
                 cursor.execute(query, params)
             else:
-                logger.info(f"Executing query: {log_query}")
                 cursor.execute(query)
-            
-            # We don't need commit because autocommit is enabled
-            return cursor
-        except mysql.connector.errors.InternalError as e:
-            # Specifically handle the "Unread result found" error
-            if "Unread result found" in str(e):
-                logger.warning("Unread result found. Reconnecting and retrying...")
-                if cursor:
-                    try:
-                        cursor.close()
-                    except:
-                        pass
-                
-                # Force reconnection
-                connection = self.reconnect()
-                if not connection:
-                    logger.error("Failed to reconnect to database")
-                    return None
-                
-                # Retry the query
-                try:
-                    cursor = connection.cursor(dictionary=True)
-                    if params:
-                        cursor.execute(query, params)
-                    else:
-                        cursor.execute(query)
-                    return cursor
-                except Exception as retry_e:
-                    logger.error(f"Error retrying query: {retry_e}")
-                    return None
-            else:
-                logger.error(f"Error executing query: {e}")
-                return None
-        except mysql.connector.Error as e:
+
+            # Outside a transaction autocommit is enabled, so there is nothing to commit here
+            result = handler(cursor)
+            rows = cursor.rowcount
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if not many and slow_query_log.should_capture(query, elapsed_ms):
+                self._capture_slow_query(connection, query, params, elapsed_ms, rows)
+            return result
+        except self.backend.disconnect_errors as e:
+            # Lost connections are dropped instead of going back to the pool
+            broken = True
+            error = e
+            logger.error(f"Error executing query: {e}")
+            return None
+        except self.backend.Error as e:
+            error = e
             logger.error(f"Error executing query: {e}")
             return None
         except Exception as e:
+            error = e
             logger.error(f"Unexpected error executing query: {e}")
             return None
-            
-    def fetch_all(self, query, params=None):
-        cursor = None
-        try:
-            cursor = self.execute_query(query, params)
-            if cursor:
-                result = cursor.fetchall()
-                count = len(result)
-                logger.info(f"fetch_all returned {count} rows")
-                return result
-            logger.warning("fetch_all: cursor is None, returning empty list")
-            return []
-        except Exception as e:
-            logger.error(f"Error in fetch_all: {e}")
-            return []
         finally:
-            if cursor:
-                cursor.close()
-        
-    def fetch_one(self, query, params=None):
+            if elapsed_ms is None:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+            # Timed before any EXPLAIN capture so it does not inflate the recorded latency
+            query_stats.record(query, elapsed_ms, rows, error is not None)
+            if prepared and cursor:
+                # Cached statements stay open; a failed one is rebuilt on next use
+                if error is not None:
+                    pool.forget_prepared(connection, query)
+            elif cursor:
+                try:
+                    cursor.close()
+                except Exception:
+                    broken = True
+            if txn:
+                if error is not None:
+                    txn.fail(error)
+            else:
+                pool.checkin(connection, discard=broken)
+
+    def _log_query(self, query, params, many):
+        # Strip to avoid logging huge queries
+        log_query = query if len(query) <= 200 else query[:200] + "..."
+        if many:
+            logger.debug(f"Executing query: {log_query} for {len(params)} parameter sets")
+        elif params:
+            log_params = params if len(params) <= 20 else f"<{len(params)} values>"
+            logger.debug(f"Executing query: {log_query} with params: {log_params}")
+        else:
+            logger.debug(f"Executing query: {log_query}")
+
+    def _capture_slow_query(self, connection, query, params, elapsed_ms, rows):
+        """Log a slow statement once per fingerprint, with its EXPLAIN plan and call site"""
+        plan = []
+        explain_error = None
+        if query.lstrip().upper().startswith(EXPLAINABLE_PREFIXES):
+            try:
+                plan = self.backend.explain(connection, query, params)
+            except Exception as e:
+                explain_error = str(e)
+        else:
+            explain_error = "statement cannot be explained"
+
+        entry = slow_query_log.record(query, elapsed_ms, rows, _call_site(), plan, explain_error)
+        steps = "; ".join(
+            step['detail'] if 'detail' in step else
+            f"{step.get('table')}: type={step.get('type')} key={step.get('key')} rows={step.get('rows')} extra={step.get('Extra')}"
+            for step in plan
+        )
+        slow_logger.warning(
+            f"Slow query ({entry['elapsed_ms']} ms, {rows} rows, ~{entry['estimated_rows_examined']} rows examined) "
+            f"from {entry['call_site']}: {entry['fingerprint'][:500]} | plan: {steps or explain_error}"
+        )
+
+    def execute_query(self, query, params=None):
+        return self._execute(query, params, QueryResult)
+
+    def fetch_all(self, query, params=None, prepared=False):
+        result = self._execute(query, params, lambda cursor: cursor.fetchall(), prepared=prepared, read=True)
+        if result is None:
+            logger.warning("fetch_all: query failed, returning empty list")
+            return []
+        logger.debug(f"fetch_all returned {len(result)} rows")
+        return result
+
+    def fetch_one(self, query, params=None, prepared=False):
+        def handler(cursor):
+            row = cursor.fetchone()
+            # Drain any remaining rows so the connection is clean for the next borrower
+            if cursor.with_rows:
+                cursor.fetchall()
+            return row
+
+        result = self._execute(query, params, handler, prepared=prepared, read=True)
+        if logger.isEnabledFor(logging.DEBUG):
+            if result:
+                logger.debug(f"fetch_one returned a row with keys: {list(result.keys())}")
+            else:
+                logger.debug("fetch_one returned None (no matching row)")
+        return result
+
+    def iter_rows(self, query, params=None, chunk_size=None):
+        """
+        Stream the rows of a query with an unbuffered cursor, fetching
+        chunk_size rows per round trip, so memory use stays constant no matter
+        how many rows match. The connection is held until the generator is
+        exhausted or closed. Errors are raised rather than swallowed, since a
+        silently truncated stream is worse than a failed one.
+        """
+        chunk_size = chunk_size or DB_STREAM_CHUNK_SIZE
+        txn = self.pool.current_transaction()
+        pool = self.pool
+        if txn:
+            # Inside a transaction the pinned connection is used, so the caller
+            # must finish iterating before issuing other statements
+            connection = txn.connection
+        else:
+            pool, connection = self._checkout(self._read_pool())
+
         cursor = None
+        exhausted = False
+        broken = False
+        failed = False
+        count = 0
+        query_budget.record(query)
+        started = time.perf_counter()
         try:
-            cursor = self.execute_query(query, params)
-            if cursor:
-                result = cursor.fetchone()
-                if result:
-                    logger.info(f"fetch_one returned a row with keys: {list(result.keys())}")
-                else:
-                    logger.info("fetch_one returned None (no matching row)")
-                return result
-            logger.warning("fetch_one: cursor is None, returning None")
-            return None
-        except Exception as e:
-            logger.error(f"Error in fetch_one: {e}")
-            return None
+            cursor = connection.cursor(dictionary=True, buffered=False)
+            logger.debug(f"Streaming query: {query[:200]}")
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    exhausted = True
+                    break
+                for row in rows:
+                    count += 1
+                    yield row
+        except self.backend.Error as e:
+            logger.error(f"Error streaming query: {e}")
+            broken = True
+            failed = True
+            if txn:
+                txn.fail(e)
+            raise
         finally:
+            query_stats.record(query, (time.perf_counter() - started) * 1000, count, failed)
             if cursor:
-                cursor.close()
-        
+                if not exhausted and not txn:
+                    # Dropping the connection is cheaper than draining the unread rows
+                    broken = True
+                else:
+                    try:
+                        cursor.close()
+                    except Exception:
+                        broken = True
+            if not txn:
+                pool.checkin(connection, discard=broken)
+            logger.debug(f"iter_rows streamed {count} rows")
+
     def insert(self, query, params=None):
-        cursor = None
-        try:
-            cursor = self.execute_query(query, params)
-            if cursor:
-                last_id = cursor.lastrowid
-                logger.info(f"insert returned last_id: {last_id}")
-                return last_id
-            logger.warning("insert: cursor is None, returning None")
+        last_id = self._execute(query, params, lambda cursor: cursor.lastrowid)
+        if last_id is None:
+            logger.warning("insert: query failed, returning None")
             return None
-        except Exception as e:
-            logger.error(f"Error in insert: {e}")
-            return None
-        finally:
-            if cursor:
-                cursor.close() 
\ No newline at end of file
+        logger.debug(f"insert returned last_id: {last_id}")
+        return last_id
+
+    def insert_many(self, table, columns, rows, chunk_size=None):
+        """
+        Insert rows with multi-row INSERT ... VALUES statements of at most
+        chunk_size rows each. Returns the number of rows written, the number
+        of statements sent and the (first_id, last_id) range of each chunk.
+        """
+        chunk_size = chunk_size or DB_BULK_CHUNK_SIZE
+        rows = list(rows)
+        result = {"rowcount": 0, "statements": 0, "id_ranges": []}
+        if not rows:
+            return result
+
+        column_list = ', '.join(columns)
+        row_placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            query = f"INSERT INTO {table} ({column_list}) VALUES " + ', '.join([row_placeholder] * len(chunk))
+            params = tuple(value for row in chunk for value in row)
+            written = self._execute(query, params, lambda cursor: (cursor.rowcount, cursor.lastrowid))
+            if written is None:
+                logger.error(f"insert_many: chunk starting at row {start} into {table} failed")
+                result["error"] = f"Bulk insert into {table} failed after {result['rowcount']} rows"
+                return result
+
+            rowcount, first_id = written
+            result["rowcount"] += rowcount
+            result["statements"] += 1
+            # A single multi-row insert gets consecutive ids; the backend reports the first or the last
+            first_id = self.backend.first_insert_id(first_id, rowcount)
+            if first_id:
+                result["id_ranges"].append((first_id, first_id + rowcount - 1))
+
+        logger.debug(f"insert_many wrote {result['rowcount']} rows into {table} in {result['statements']} statements")
+        return result
+
+    def execute_many(self, query, seq_params, chunk_size=None):
+        """
+        Run one statement for many parameter sets using executemany, sending
+        at most chunk_size parameter sets per call. Returns the total rowcount
+        or None if a chunk failed.
+        """
+        chunk_size = chunk_size or DB_BULK_CHUNK_SIZE
+        seq_params = list(seq_params)
+        total = 0
+        for start in range(0, len(seq_params), chunk_size):
+            chunk = seq_params[start:start + chunk_size]
+            rowcount = self._execute(query, chunk, lambda cursor: cursor.rowcount, many=True)
+            if rowcount is None:
+                logger.error(f"execute_many: chunk starting at parameter set {start} failed")
+                return None
+            total += rowcount
+        logger.debug(f"execute_many affected {total} rows")
+        return total
+
+    def update_many(self, table, key_column, columns, rows, keep_columns=(), chunk_size=None):
+        """
+        Set different values on many rows with one UPDATE per chunk, using a
+        CASE on key_column for each column. Rows are tuples of the key value
+        followed by the new values. keep_columns are assigned to themselves,
+        so ON UPDATE CURRENT_TIMESTAMP columns keep their value. Returns the
+        rowcount or None if a chunk failed.
+        """
+        chunk_size = chunk_size or DB_BULK_CHUNK_SIZE
+        rows = list(rows)
+        total = 0
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            assignments = [
+                f"{column} = CASE {key_column} " + ' '.join(['WHEN %s THEN %s'] * len(chunk)) + " END"
+                for column in columns
+            ] + [f"{column} = {column}" for column in keep_columns]
+            query = (
+                f"UPDATE {table} SET {', '.join(assignments)} "
+                f"WHERE {key_column} IN ({', '.join(['%s'] * len(chunk))})"
+            )
+            params = tuple(
+                value
+                for index in range(len(columns))
+                for row in chunk
+                for value in (row[0], row[index + 1])
+            ) + tuple(row[0] for row in chunk)
+            rowcount = self._execute(query, params, lambda cursor: cursor.rowcount)
+            if rowcount is None:
+                logger.error(f"update_many: chunk starting at row {start} of {table} failed")
+                return None
+            total += rowcount
+        return total
+
+    def upsert_increment(self, table, key_columns, increment_columns, rows, chunk_size=None):
+        """
+        Add each row's increments to the counters of the row with the same
+        key, inserting it when missing, in one round trip per chunk. Rows
+        are tuples of key values followed by increments. Returns the rowcount
+        or None if a chunk failed.
+        """
+        chunk_size = chunk_size or DB_BULK_CHUNK_SIZE
+        rows = list(rows)
+        columns = tuple(key_columns) + tuple(increment_columns)
+        column_list = ', '.join(columns)
+        row_placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        if self.dialect == 'sqlite':
+            conflict = (
+                f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET "
+                + ', '.join(f"{column} = {column} + excluded.{column}" for column in increment_columns)
+            )
+        else:
+            conflict = "ON DUPLICATE KEY UPDATE " + ', '.join(
+                f"{column} = {column} + VALUES({column})" for column in increment_columns
+            )
+
+        total = 0
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            query = (
+                f"INSERT INTO {table} ({column_list}) VALUES "
+                + ', '.join([row_placeholder] * len(chunk)) + f" {conflict}"
+            )
+            params = tuple(value for row in chunk for value in row)
+            rowcount = self._execute(query, params, lambda cursor: cursor.rowcount)
+            if rowcount is None:
+                logger.error(f"upsert_increment: chunk starting at row {start} into {table} failed")
+                return None
+            total += rowcount
+        return total
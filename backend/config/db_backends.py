@@ -0,0 +1,239 @@
+import mysql.connector
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Which backend Database talks to: mysql (default) or sqlite for offline runs
+DB_BACKEND = os.getenv('DB_BACKEND', 'mysql').lower()
+# Database file used by the sqlite backend
+DB_SQLITE_PATH = os.getenv('DB_SQLITE_PATH', 'loan_tracker.sqlite3')
+
+
+class MySQLBackend:
+    """The production backend, a thin layer over mysql.connector"""
+
+    name = 'mysql'
+    Error = mysql.connector.Error
+    # Errors after which a connection is dropped instead of going back to the pool
+    disconnect_errors = (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError)
+    supports_replicas = True
+
+    def connect(self, config):
+        return mysql.connector.connect(**config)
+
+    def pool_name(self, config):
+        return f"{config['host']}:{config.get('port', 3306)}/{config['database']}"
+
+    def pool_key(self, config):
+        return (self.name, config['host'], config.get('port', 3306), config['user'], config['database'])
+
+    def explain(self, connection, query, params):
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("EXPLAIN " + query, params or ())
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def first_insert_id(self, lastrowid, rowcount):
+        # MySQL reports the first id generated by a multi-row insert
+        return lastrowid
+
+
+# SQLite understands most of the SQL the models send; these rewrite the rest
+_PLACEHOLDER_RE = re.compile(r'%s')
+_NOW_RE = re.compile(r'\bNOW\(\)', re.I)
+_CURDATE_RE = re.compile(r'\bCURDATE\(\)', re.I)
+_FOR_UPDATE_RE = re.compile(r'\s+FOR\s+UPDATE\b', re.I)
+_INSERT_IGNORE_RE = re.compile(r'\bINSERT\s+IGNORE\b', re.I)
+_AUTO_INCREMENT_PK_RE = re.compile(r'\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b', re.I)
+_ENUM_RE = re.compile(r'\bENUM\s*\([^)]*\)', re.I)
+_JSON_TYPE_RE = re.compile(r'\bJSON\b(?!\s*\()', re.I)
+_ON_UPDATE_RE = re.compile(r'\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP\b', re.I)
+_CREATE_TABLE_RE = re.compile(r'^\s*CREATE\s+TABLE\b', re.I)
+
+
+@lru_cache(maxsize=1024)
+def translate_sqlite(query):
+    """Rewrite a MySQL statement into the SQLite dialect"""
+    if _CREATE_TABLE_RE.match(query):
+        query = _AUTO_INCREMENT_PK_RE.sub('INTEGER PRIMARY KEY AUTOINCREMENT', query)
+        query = _ENUM_RE.sub('TEXT', query)
+        query = _JSON_TYPE_RE.sub('TEXT', query)
+        query = _ON_UPDATE_RE.sub('', query)
+    query = _PLACEHOLDER_RE.sub('?', query)
+    query = _NOW_RE.sub('CURRENT_TIMESTAMP', query)
+    query = _CURDATE_RE.sub('CURRENT_DATE', query)
+    query = _FOR_UPDATE_RE.sub('', query)
+    query = _INSERT_IGNORE_RE.sub('INSERT OR IGNORE', query)
+    return query
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def _parse_timestamp(value):
+    return datetime.fromisoformat(value.decode())
+
+
+# Return the same Python types mysql.connector does for the column types the schema uses
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('DECIMAL', lambda value: Decimal(value.decode()))
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()[:10]))
+sqlite3.register_converter('TIMESTAMP', _parse_timestamp)
+sqlite3.register_converter('DATETIME', _parse_timestamp)
+
+
+class SQLiteCursor:
+    """Cursor with the parts of the mysql.connector cursor API Database relies on"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._fetched = 0
+
+    def execute(self, query, params=None):
+        self._fetched = 0
+        self._cursor.execute(translate_sqlite(query), params or ())
+
+    def executemany(self, query, seq_params):
+        self._fetched = 0
+        self._cursor.executemany(translate_sqlite(query), seq_params)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._fetched += 1
+        return row
+
+    def fetchmany(self, size):
+        rows = self._cursor.fetchmany(size)
+        self._fetched += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._fetched += len(rows)
+        return rows
+
+    @property
+    def with_rows(self):
+        return self._cursor.description is not None
+
+    @property
+    def rowcount(self):
+        # SQLite reports -1 for SELECT; mysql.connector reports the rows read so far
+        return self._fetched if self.with_rows else self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Connection with the parts of the mysql.connector connection API the pool relies on"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, dictionary=True, buffered=None, prepared=False):
+        # SQLite caches compiled statements per connection, so prepared needs no special cursor
+        return SQLiteCursor(self._connection.cursor())
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def start_transaction(self):
+        self._connection.execute("BEGIN")
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def ping(self, reconnect=False):
+        self._connection.execute("SELECT 1").fetchone()
+
+    def is_connected(self):
+        try:
+            self.ping()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self._connection.close()
+
+
+class SQLiteBackend:
+    """
+    In-process backend for offline benchmarks and CI. Builds the same schema
+    from the models' MySQL DDL and accepts the same statements, rewritten by
+    translate_sqlite.
+    """
+
+    name = 'sqlite'
+    # Pool timeouts are still raised as mysql.connector PoolError
+    Error = (sqlite3.Error, mysql.connector.Error)
+    disconnect_errors = (sqlite3.InterfaceError,)
+    supports_replicas = False
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+
+    def connect(self, config):
+        connection = sqlite3.connect(
+            config['database'],
+            timeout=self.timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            # The pool hands connections between threads but never shares one
+            check_same_thread=False,
+            # Autocommit outside explicit transactions, like the MySQL connections
+            isolation_level=None,
+            cached_statements=256,
+        )
+        connection.row_factory = _dict_row
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        return SQLiteConnection(connection)
+
+    def pool_name(self, config):
+        return f"sqlite:{config['database']}"
+
+    def pool_key(self, config):
+        return (self.name, os.path.abspath(config['database']))
+
+    def explain(self, connection, query, params):
+        cursor = connection.cursor()
+        try:
+            cursor.execute("EXPLAIN QUERY PLAN " + query, params or ())
+            return [{"table": None, "detail": step.get('detail')} for step in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def first_insert_id(self, lastrowid, rowcount):
+        # SQLite reports the last id; a single statement's ids are consecutive
+        return lastrowid - rowcount + 1 if lastrowid else lastrowid
+
+
+def get_backend(name=None):
+    name = (name or DB_BACKEND).lower()
+    if name == 'mysql':
+        return MySQLBackend()
+    if name == 'sqlite':
+        return SQLiteBackend()
+    raise ValueError(f"Unknown DB_BACKEND '{name}', expected mysql or sqlite")
@@ -0,0 +1,151 @@
+import contextvars
+import logging
+import os
+from collections import Counter
+from contextlib import contextmanager
+from config.query_stats import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Maximum statements per request or task before the unit of work is flagged
+DB_QUERY_BUDGET = int(os.getenv('DB_QUERY_BUDGET', 50))
+# Maximum executions of one fingerprint per unit of work, the usual N+1 signature
+DB_QUERY_REPEAT_LIMIT = int(os.getenv('DB_QUERY_REPEAT_LIMIT', 10))
+# warn logs violations, raise fails the unit of work (meant for tests), off disables tracking
+DB_QUERY_BUDGET_MODE = os.getenv('DB_QUERY_BUDGET_MODE', 'warn').lower()
+
+_current = contextvars.ContextVar('query_budget', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in raise mode when a unit of work goes over its query budget"""
+
+    def __init__(self, budget, violations):
+        self.budget = budget
+        self.violations = violations
+        super().__init__(f"{budget.name}: " + "; ".join(violations))
+
+
+class QueryBudget:
+    """Counts the statements issued by one request or task, per fingerprint"""
+
+    def __init__(self, name, max_queries=None, repeat_limit=None, mode=None):
+        self.name = name
+        self.max_queries = DB_QUERY_BUDGET if max_queries is None else max_queries
+        self.repeat_limit = DB_QUERY_REPEAT_LIMIT if repeat_limit is None else repeat_limit
+        self.mode = (mode or DB_QUERY_BUDGET_MODE).lower()
+        self.total = 0
+        self.fingerprints = Counter()
+
+    def record(self, query):
+        self.total += 1
+        self.fingerprints[fingerprint(query)] += 1
+
+    def violations(self):
+        found = []
+        if self.max_queries and self.total > self.max_queries:
+            found.append(f"{self.total} queries exceed the budget of {self.max_queries}")
+        if self.repeat_limit:
+            for key, count in self.fingerprints.most_common():
+                if count <= self.repeat_limit:
+                    break
+                found.append(f"possible N+1, {count} executions of: {key[:200]}")
+        return found
+
+    def check(self):
+        """Log or raise according to mode; returns the list of violations"""
+        found = self.violations()
+        if found and self.mode == 'raise':
+            raise QueryBudgetExceeded(self, found)
+        for violation in found:
+            logger.warning(f"Query budget exceeded in {self.name}: {violation}")
+        return found
+
+
+def record(query):
+    """Count a statement against the active unit of work, if any"""
+    budget = _current.get()
+    if budget is not None:
+        budget.record(query)
+
+
+def current():
+    return _current.get()
+
+
+def begin(name, **kwargs):
+    """Start tracking a unit of work; returns the token to pass to end()"""
+    if (kwargs.get('mode') or DB_QUERY_BUDGET_MODE) == 'off':
+        return None
+    return _current.set(QueryBudget(name, **kwargs))
+
+
+def end(token, check=True):
+    """Stop tracking the unit of work started with begin() and check it"""
+    if token is None:
+        return []
+    budget = _current.get()
+    _current.reset(token)
+    return budget.check() if check and budget is not None else []
+
+
+@contextmanager
+def query_budget(name='block', max_queries=None, repeat_limit=None, mode='raise'):
+    """
+    Track the statements issued inside the block, e.g. in a test:
+
+        with query_budget('ach batch', max_queries=10):
+            loan_model.create_ach_batch(batch_date)
+
+    Defaults to raise mode so regressions fail loudly.
+    """
+    token = begin(name, max_queries=max_queries, repeat_limit=repeat_limit, mode=mode)
+    try:
+        yield _current.get() if token else None
+    except Exception:
+        end(token, check=False)
+        raise
+    end(token)
+
+
+def init_app(app):
+    """Track one unit of work per Flask request"""
+
+    @app.before_request
+    def _begin_query_budget():
+        from flask import g, request
+        g.query_budget_token = begin(f"{request.method} {request.path}")
+
+    @app.after_request
+    def _check_query_budget(response):
+        from flask import g
+        token = g.pop('query_budget_token', None)
+        if token is not None:
+            budget = _current.get()
+            end(token)
+            if budget is not None:
+                response.headers['X-Query-Count'] = str(budget.total)
+        return response
+
+    @app.teardown_request
+    def _reset_query_budget(exc):
+        # after_request does not run when the view raised; drop the counter unchecked
+        from flask import g
+        token = g.pop('query_budget_token', None)
+        if token is not None:
+            end(token, check=False)
+
+
+def init_celery(celery_app):
+    """Track one unit of work per Celery task"""
+    from celery import signals
+
+    tokens = {}
+
+    @signals.task_prerun.connect(weak=False)
+    def _begin_task_budget(task_id=None, task=None, **kwargs):
+        tokens[task_id] = begin(task.name if task else str(task_id))
+
+    @signals.task_postrun.connect(weak=False)
+    def _check_task_budget(task_id=None, **kwargs):
+        end(tokens.pop(task_id, None))
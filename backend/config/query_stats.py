@@ -0,0 +1,211 @@
+import os
+import re
+import threading
+from functools import lru_cache
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Statements slower than this (milliseconds) are logged once with their plan; 0 disables the log
+DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 500))
+
+_COMMENT_RE = re.compile(r'(--[^\n]*|/\*.*?\*/)', re.S)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_WHITESPACE_RE = re.compile(r'\s+')
+_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ROWS_RE = re.compile(r'\(\?\+\)(?:\s*,\s*\(\?\+\))+')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(query):
+    """
+    Normalize a statement so that calls differing only in literal values,
+    IN-list length or number of VALUES rows share one fingerprint.
+    """
+    normalized = _COMMENT_RE.sub(' ', query)
+    normalized = _STRING_RE.sub('?', normalized)
+    normalized = normalized.replace('%s', '?')
+    normalized = _NUMBER_RE.sub('?', normalized)
+    normalized = _WHITESPACE_RE.sub(' ', normalized).strip()
+    normalized = _LIST_RE.sub('(?+)', normalized)
+    normalized = _ROWS_RE.sub('(?+), ...', normalized)
+    return normalized
+
+
+class QueryStats:
+    """Counters and latency histogram for one query fingerprint"""
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        # One slot per bucket plus a final overflow slot
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, elapsed_ms, rows, error):
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if rows and rows > 0:
+            self.rows += rows
+        if error:
+            self.errors += 1
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[index] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile(self, fraction):
+        """Estimate a latency percentile as the upper bound of the bucket it falls in"""
+        if not self.calls:
+            return 0.0
+        target = fraction * self.calls
+        cumulative = 0
+        for index, count in enumerate(self.buckets):
+            cumulative += count
+            if cumulative >= target:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return min(float(LATENCY_BUCKETS_MS[index]), self.max_ms)
+                return self.max_ms
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            "fingerprint": self.fingerprint,
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+        }
+
+
+class QueryStatsRegistry:
+    """In-process registry of QueryStats keyed by fingerprint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, query, elapsed_ms, rows=0, error=False):
+        key = fingerprint(query)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = QueryStats(key)
+                self._stats[key] = stats
+            stats.record(elapsed_ms, rows, error)
+        return key
+
+    def snapshot(self, sort_by='total_ms', limit=None):
+        with self._lock:
+            entries = [stats.to_dict() for stats in self._stats.values()]
+        entries.sort(key=lambda entry: entry.get(sort_by, 0), reverse=True)
+        return entries[:limit] if limit else entries
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def to_prometheus(self):
+        """Render the registry in the Prometheus text exposition format"""
+        with self._lock:
+            stats_list = [
+                (stats.fingerprint, list(stats.buckets), stats.calls, stats.total_ms, stats.rows, stats.errors)
+                for stats in self._stats.values()
+            ]
+
+        lines = [
+            "# HELP db_query_duration_seconds Query latency by fingerprint",
+            "# TYPE db_query_duration_seconds histogram",
+        ]
+        for key, buckets, calls, total_ms, _, _ in stats_list:
+            label = _escape_label(key)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS_MS, buckets):
+                cumulative += count
+                lines.append(f'db_query_duration_seconds_bucket{{query="{label}",le="{bound / 1000}"}} {cumulative}')
+            lines.append(f'db_query_duration_seconds_bucket{{query="{label}",le="+Inf"}} {calls}')
+            lines.append(f'db_query_duration_seconds_sum{{query="{label}"}} {total_ms / 1000:.6f}')
+            lines.append(f'db_query_duration_seconds_count{{query="{label}"}} {calls}')
+
+        lines.append("# HELP db_query_rows_total Rows returned or affected by fingerprint")
+        lines.append("# TYPE db_query_rows_total counter")
+        for key, _, _, _, rows, _ in stats_list:
+            lines.append(f'db_query_rows_total{{query="{_escape_label(key)}"}} {rows}')
+
+        lines.append("# HELP db_query_errors_total Failed executions by fingerprint")
+        lines.append("# TYPE db_query_errors_total counter")
+        for key, _, _, _, _, errors in stats_list:
+            lines.append(f'db_query_errors_total{{query="{_escape_label(key)}"}} {errors}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Process-wide registry used by config.db.Database
+registry = QueryStatsRegistry()
+
+
+class SlowQueryLog:
+    """
+    Keeps one entry per fingerprint for statements slower than threshold_ms,
+    with the EXPLAIN plan and the call site that issued them.
+    """
+
+    def __init__(self, threshold_ms):
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def should_capture(self, query, elapsed_ms):
+        """True the first time a fingerprint runs slower than the threshold"""
+        if not self.threshold_ms or elapsed_ms < self.threshold_ms:
+            return False
+        key = fingerprint(query)
+        with self._lock:
+            if key in self._entries:
+                return False
+            # Reserve the slot so concurrent slow calls do not all run EXPLAIN
+            self._entries[key] = None
+        return True
+
+    def record(self, query, elapsed_ms, rows, call_site, plan, explain_error=None):
+        key = fingerprint(query)
+        entry = {
+            "fingerprint": key,
+            "elapsed_ms": round(elapsed_ms, 3),
+            "rows": rows,
+            "call_site": call_site,
+            "plan": plan,
+            "estimated_rows_examined": sum(int(step.get('rows') or 0) for step in plan),
+            "explain_error": explain_error,
+        }
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def entries(self):
+        with self._lock:
+            return [entry for entry in self._entries.values() if entry is not None]
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Process-wide slow query log used by config.db.Database
+slow_query_log = SlowQueryLog(DB_SLOW_QUERY_MS)
@@ -73,6 +73,7 @@ def diagnose_database():
                 logger.error("❌ 'users' table not found")
                 
             cursor.close()
+            db.release(connection)
         else:
             logger.error("❌ Could not connect to database")
     except Exception as e:
@@ -29,8 +29,7 @@ def create_database():
         # Usar la base de datos
         cursor.execute(f"USE {db_name}")
         
-        # Aquí puedes inicializar tablas si lo deseas,
-        # pero en nuestra implementación actual esto se hace desde el modelo User
+        # Las tablas se crean con las migraciones: python3 migrate.py upgrade
         
         print("Inicialización de la base de datos completada.")
         
@@ -0,0 +1,150 @@
+import argparse
+import logging
+import sys
+from datetime import datetime
+from config.db import Database, read_your_writes
+from migrations import index_columns, load_migrations
+from migrations.payments_partitioning import list_partitions, partition_payments
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def ensure_version_table(db):
+    query = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version VARCHAR(14) PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """
+    if db.execute_query(query) is None:
+        raise RuntimeError("Could not create the schema_migrations table")
+
+
+def applied_versions(db):
+    return {row['version'] for row in db.fetch_all("SELECT version FROM schema_migrations")}
+
+
+def upgrade(db):
+    """Apply the migrations not yet recorded in schema_migrations, oldest first"""
+    ensure_version_table(db)
+    applied = applied_versions(db)
+    pending = [(version, name, module) for version, name, module in load_migrations() if version not in applied]
+    if not pending:
+        logger.info("✅ Database is up to date")
+        return True
+
+    for version, name, module in pending:
+        logger.info(f"Applying migration {version}_{name}")
+        try:
+            module.upgrade(db)
+        except Exception as e:
+            logger.error(f"❌ Migration {version}_{name} failed: {e}")
+            return False
+        # DDL commits implicitly on MySQL, so the version is recorded after the migration succeeds;
+        # migrations are written to be safe to re-run if this insert is lost
+        db.insert("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+    logger.info(f"✅ Applied {len(pending)} migration(s)")
+    return True
+
+
+def status(db):
+    ensure_version_table(db)
+    applied = applied_versions(db)
+    for version, name, _ in load_migrations():
+        logger.info(f"{'applied' if version in applied else 'pending'}  {version}_{name}")
+    return True
+
+
+def partition_payments_table(db):
+    """Opt-in: partition payments by month of due_date (rebuilds the table)"""
+    try:
+        if partition_payments(db):
+            logger.info(f"✅ payments partitioned: {[partition['name'] for partition in list_partitions(db)]}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Partitioning payments failed: {e}")
+        return False
+
+
+def backfill_daily_collections(start_date=None, end_date=None):
+    """Rebuild the daily_collections rollup from the payment rows"""
+    from models.loan import Loan
+
+    result = Loan().rebuild_daily_collections(start_date, end_date)
+    if 'error' in result:
+        logger.error(f"❌ {result['error']}")
+        return False
+    logger.info(f"✅ daily_collections rebuilt ({result['rows']} rows)")
+    return True
+
+
+def verify_indexes(db):
+    """Check that every index declared by a migration exists and is used by its query"""
+    ok = True
+    for version, name, module in load_migrations():
+        for index in getattr(module, 'INDEXES', []):
+            columns = index_columns(db, index['table'], index['name'])
+            if not columns:
+                logger.error(f"❌ {index['table']}.{index['name']} is missing (migration {version}_{name})")
+                ok = False
+                continue
+            if tuple(columns) != tuple(index['columns']):
+                logger.error(f"❌ {index['table']}.{index['name']} has columns {columns}, expected {list(index['columns'])}")
+                ok = False
+                continue
+
+            connection = db.connect()
+            if not connection:
+                logger.error("❌ Could not connect to the database to check query plans")
+                return False
+            try:
+                plan = db.backend.explain(connection, index['query'], index['params'])
+            finally:
+                db.release(connection)
+            used = any(
+                step.get('key') == index['name'] or index['name'] in (step.get('detail') or '')
+                for step in plan
+            )
+            if used:
+                logger.info(f"✅ {index['table']}.{index['name']} ({', '.join(columns)}) is used by its query")
+            else:
+                # An empty table can make the optimizer prefer a scan, so this is only a warning
+                logger.warning(f"⚠️ {index['table']}.{index['name']} exists but the optimizer did not choose it: {plan}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database schema migrations")
+    parser.add_argument('command', choices=['upgrade', 'status', 'verify-indexes', 'partition-payments', 'backfill-daily-collections'])
+    parser.add_argument('--from', dest='start_date', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        help="First due date to rebuild (YYYY-MM-DD), for backfill-daily-collections")
+    parser.add_argument('--to', dest='end_date', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        help="Last due date to rebuild (YYYY-MM-DD), for backfill-daily-collections")
+    args = parser.parse_args()
+
+    db = Database()
+    # Schema reads must see the primary: a lagging replica would report applied
+    # migrations as pending and existing indexes as missing
+    with read_your_writes():
+        if args.command == 'upgrade':
+            ok = upgrade(db)
+        elif args.command == 'status':
+            ok = status(db)
+        elif args.command == 'partition-payments':
+            ok = partition_payments_table(db)
+        elif args.command == 'backfill-daily-collections':
+            ok = backfill_daily_collections(args.start_date, args.end_date)
+        else:
+            ok = verify_indexes(db)
+    db.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Base tables, previously created by the model constructors. Uses IF NOT
+EXISTS so databases created by the old constructors are adopted as-is.
+"""
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        email VARCHAR(255) NOT NULL UNIQUE,
+        password VARCHAR(255) NOT NULL,
+        first_name VARCHAR(100),
+        last_name VARCHAR(100),
+        role ENUM('admin', 'user') DEFAULT 'user',
+        language VARCHAR(10) DEFAULT 'es',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS business_owners (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        business_name VARCHAR(255) NOT NULL,
+        business_address VARCHAR(255),
+        phone_number VARCHAR(20),
+        tax_id VARCHAR(50),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS loan_applications (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        status ENUM('draft', 'submitted', 'reviewing', 'approved', 'declined', 'undecided') DEFAULT 'draft',
+        business_name VARCHAR(255),
+        tax_id VARCHAR(50),
+        business_info JSON,
+        financial_info JSON,
+        loan_amount DECIMAL(10, 2) NULL,
+        loan_purpose VARCHAR(255) NULL,
+        loan_term INT NULL,
+        loan_interest_rate DECIMAL(5, 4) NULL,
+        loan_total_amount DECIMAL(12, 2) NULL,
+        loan_monthly_payment DECIMAL(12, 2) NULL,
+        submitted_at TIMESTAMP NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS loans (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        application_id INT NOT NULL,
+        user_id INT NOT NULL,
+        business_name VARCHAR(255) NOT NULL,
+        tax_id VARCHAR(50) NOT NULL,
+        status ENUM('active', 'closed', 'defaulted') DEFAULT 'active',
+        amount DECIMAL(10, 2) NOT NULL,
+        term_days INT NOT NULL,
+        interest_rate DECIMAL(5, 2) NOT NULL,
+        remaining_balance DECIMAL(10, 2) NOT NULL,
+        daily_payment DECIMAL(10, 2) NOT NULL,
+        start_date DATE NOT NULL,
+        end_date DATE NOT NULL,
+        funded_at TIMESTAMP NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (application_id) REFERENCES loan_applications(id),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS payments (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        loan_id INT NOT NULL,
+        amount DECIMAL(10, 2) NOT NULL,
+        status ENUM('scheduled', 'processing', 'completed', 'failed') DEFAULT 'scheduled',
+        due_date DATE NOT NULL,
+        processed_at TIMESTAMP NULL,
+        ach_batch_id INT NULL,
+        ach_transaction_id VARCHAR(50) NULL,
+        failure_reason VARCHAR(255) NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (loan_id) REFERENCES loans(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ach_batches (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        status ENUM('pending', 'processed', 'completed') DEFAULT 'pending',
+        batch_date DATE NOT NULL,
+        file_name VARCHAR(255) NULL,
+        total_transactions INT NOT NULL DEFAULT 0,
+        total_amount DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ach_transactions (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        batch_id INT NOT NULL,
+        payment_id INT NOT NULL,
+        status ENUM('pending', 'processed', 'failed', 'returned') DEFAULT 'pending',
+        trace_number VARCHAR(50) NULL,
+        amount DECIMAL(10, 2) NOT NULL,
+        failure_reason VARCHAR(255) NULL,
+        processed_at TIMESTAMP NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (batch_id) REFERENCES ach_batches(id),
+        FOREIGN KEY (payment_id) REFERENCES payments(id)
+    )
+    """,
+]
+
+
+def upgrade(db):
+    for statement in STATEMENTS:
+        if db.execute_query(statement) is None:
+            raise RuntimeError(f"Failed to run: {statement.strip().splitlines()[0]}")
@@ -0,0 +1,53 @@
+"""
+Composite indexes for the payments and ACH hot paths. Each one covers the
+predicate of a query that otherwise scans the whole table.
+"""
+from migrations import create_index
+
+INDEXES = [
+    {
+        # create_ach_batch: scheduled payments due on the batch date
+        "table": "payments",
+        "name": "idx_payments_due_date_status",
+        "columns": ("due_date", "status", "loan_id", "amount"),
+        "query": "SELECT id, loan_id, amount FROM payments WHERE due_date = %s AND status = 'scheduled'",
+        "params": ("2000-01-01",),
+    },
+    {
+        # Return file parser: trace number to payment
+        "table": "ach_transactions",
+        "name": "idx_ach_transactions_trace_number",
+        "columns": ("trace_number", "payment_id"),
+        "query": "SELECT payment_id FROM ach_transactions WHERE trace_number = %s LIMIT 1",
+        "params": ("0",),
+    },
+    {
+        # get_ach_transactions: pending transactions of a batch
+        "table": "ach_transactions",
+        "name": "idx_ach_transactions_batch_status",
+        "columns": ("batch_id", "status", "payment_id"),
+        "query": "SELECT payment_id FROM ach_transactions WHERE batch_id = %s AND status = 'pending'",
+        "params": (0,),
+    },
+    {
+        # get_loans_by_user
+        "table": "loans",
+        "name": "idx_loans_user_status",
+        "columns": ("user_id", "status"),
+        "query": "SELECT * FROM loans WHERE user_id = %s",
+        "params": (0,),
+    },
+    {
+        # get_applications_by_user, newest first
+        "table": "loan_applications",
+        "name": "idx_loan_applications_user_created",
+        "columns": ("user_id", "created_at"),
+        "query": "SELECT * FROM loan_applications WHERE user_id = %s ORDER BY created_at DESC",
+        "params": (0,),
+    },
+]
+
+
+def upgrade(db):
+    for index in INDEXES:
+        create_index(db, index["table"], index["name"], index["columns"])
@@ -0,0 +1,19 @@
+"""
+Store every email trimmed and lowercased, so logins can match users.email
+exactly and use its UNIQUE index instead of scanning LOWER(email).
+"""
+
+
+def upgrade(db):
+    collisions = db.fetch_all("""
+        SELECT LOWER(TRIM(email)) AS normalized_email, COUNT(*) AS accounts
+        FROM users
+        GROUP BY LOWER(TRIM(email))
+        HAVING COUNT(*) > 1
+    """)
+    if collisions:
+        emails = ', '.join(f"{row['normalized_email']} ({row['accounts']} accounts)" for row in collisions)
+        raise RuntimeError(f"Accounts must be merged by hand before normalizing emails: {emails}")
+
+    if db.execute_query("UPDATE users SET email = LOWER(TRIM(email))") is None:
+        raise RuntimeError("Failed to normalize users.email")
@@ -0,0 +1,48 @@
+"""
+History tables for settled payments of closed loans and their ACH
+transactions, filled by Loan.archive_settled_payments. Same columns as the
+hot tables plus archived_at, no foreign keys.
+"""
+from migrations import create_index
+
+
+def upgrade(db):
+    # Archived rows are written once and rarely read, so they are stored compressed on MySQL
+    table_options = " ROW_FORMAT=COMPRESSED" if db.dialect == 'mysql' else ""
+    statements = [
+        """
+        CREATE TABLE IF NOT EXISTS payments_history (
+            id INT PRIMARY KEY,
+            loan_id INT NOT NULL,
+            amount DECIMAL(10, 2) NOT NULL,
+            status ENUM('scheduled', 'processing', 'completed', 'failed') DEFAULT 'scheduled',
+            due_date DATE NOT NULL,
+            processed_at TIMESTAMP NULL,
+            ach_batch_id INT NULL,
+            ach_transaction_id VARCHAR(50) NULL,
+            failure_reason VARCHAR(255) NULL,
+            created_at TIMESTAMP NULL,
+            updated_at TIMESTAMP NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""" + table_options,
+        """
+        CREATE TABLE IF NOT EXISTS ach_transactions_history (
+            id INT PRIMARY KEY,
+            batch_id INT NOT NULL,
+            payment_id INT NOT NULL,
+            status ENUM('pending', 'processed', 'failed', 'returned') DEFAULT 'pending',
+            trace_number VARCHAR(50) NULL,
+            amount DECIMAL(10, 2) NOT NULL,
+            failure_reason VARCHAR(255) NULL,
+            processed_at TIMESTAMP NULL,
+            created_at TIMESTAMP NULL,
+            updated_at TIMESTAMP NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""" + table_options,
+    ]
+    for statement in statements:
+        if db.execute_query(statement) is None:
+            raise RuntimeError(f"Failed to run: {statement.strip().splitlines()[0]}")
+
+    create_index(db, 'payments_history', 'idx_payments_history_loan_due_date', ('loan_id', 'due_date'))
+    create_index(db, 'ach_transactions_history', 'idx_ach_transactions_history_payment', ('payment_id',))
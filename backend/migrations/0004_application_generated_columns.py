@@ -0,0 +1,68 @@
+"""
+Generated columns for the underwriting keys of the loan_applications JSON
+blobs, so validation and portfolio queries can filter in SQL. Values that
+are missing or not of the expected type become NULL instead of failing the
+write. business_name already has a plain column kept in sync by
+update_business_info, so it only gets an index.
+
+On MySQL the columns use JSON_VALUE ... RETURNING, which needs MySQL 8.0.21
+or newer.
+"""
+from migrations import column_exists, create_index
+
+# column, type, JSON column, path
+GENERATED_COLUMNS = [
+    ("annual_revenue", "DECIMAL(14, 2)", "financial_info", "$.annual_revenue"),
+    ("industry", "VARCHAR(100)", "business_info", "$.industry"),
+    ("business_years", "INT", "business_info", "$.business_years"),
+]
+
+INDEXES = [
+    {
+        "table": "loan_applications",
+        "name": "idx_loan_applications_industry_years",
+        "columns": ("industry", "business_years"),
+        "query": "SELECT id FROM loan_applications WHERE industry = %s AND business_years >= %s",
+        "params": ("retail", 2),
+    },
+    {
+        "table": "loan_applications",
+        "name": "idx_loan_applications_annual_revenue",
+        "columns": ("annual_revenue",),
+        "query": "SELECT id FROM loan_applications WHERE annual_revenue >= %s",
+        "params": (1000000,),
+    },
+    {
+        "table": "loan_applications",
+        "name": "idx_loan_applications_business_name",
+        "columns": ("business_name",),
+        "query": "SELECT id FROM loan_applications WHERE business_name = %s",
+        "params": ("",),
+    },
+]
+
+
+def _expression(db, column_type, source, path):
+    if db.dialect == 'sqlite':
+        # SQLite can only add virtual generated columns; they are indexable all the same
+        json_type = "'text'" if column_type.startswith('VARCHAR') else "'integer', 'real'"
+        return (
+            f"CASE WHEN json_valid({source}) AND json_type({source}, '{path}') IN ({json_type}) "
+            f"THEN json_extract({source}, '{path}') END"
+        ), "VIRTUAL"
+    # JSON_VALUE ... RETURNING accepts CHAR and SIGNED rather than VARCHAR and INT
+    returning = column_type.replace('VARCHAR', 'CHAR').replace('INT', 'SIGNED')
+    return f"JSON_VALUE({source}, '{path}' RETURNING {returning} NULL ON ERROR)", "STORED"
+
+
+def upgrade(db):
+    for column, column_type, source, path in GENERATED_COLUMNS:
+        if column_exists(db, 'loan_applications', column):
+            continue
+        expression, storage = _expression(db, column_type, source, path)
+        query = f"ALTER TABLE loan_applications ADD COLUMN {column} {column_type} GENERATED ALWAYS AS ({expression}) {storage}"
+        if db.execute_query(query) is None:
+            raise RuntimeError(f"Failed to add generated column loan_applications.{column}")
+
+    for index in INDEXES:
+        create_index(db, index["table"], index["name"], index["columns"])
@@ -0,0 +1,35 @@
+"""
+Per-loan, per-status payment counters maintained by the Loan model, so the
+loan summary does not read every payment row. Backfilled from payments and
+payments_history.
+"""
+
+
+def upgrade(db):
+    create = """
+    CREATE TABLE IF NOT EXISTS loan_payment_stats (
+        loan_id INT NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        payment_count INT NOT NULL DEFAULT 0,
+        amount_total DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+        PRIMARY KEY (loan_id, status)
+    )
+    """
+    if db.execute_query(create) is None:
+        raise RuntimeError("Failed to create loan_payment_stats")
+
+    # Rebuilt from scratch in one transaction, so the migration is safe to re-run
+    with db.transaction() as txn:
+        db.execute_query("DELETE FROM loan_payment_stats")
+        db.execute_query("""
+        INSERT INTO loan_payment_stats (loan_id, status, payment_count, amount_total)
+        SELECT loan_id, status, COUNT(*), SUM(amount)
+        FROM (
+            SELECT loan_id, status, amount FROM payments
+            UNION ALL
+            SELECT loan_id, status, amount FROM payments_history
+        ) all_payments
+        GROUP BY loan_id, status
+        """)
+    if txn.failed:
+        raise RuntimeError(f"Failed to backfill loan_payment_stats: {txn.error}")
@@ -0,0 +1,35 @@
+"""
+Per-day, per-status payment totals keyed by due date, maintained by the Loan
+model alongside loan_payment_stats. Backfilled here; migrate.py
+backfill-daily-collections rebuilds it for a date range.
+"""
+
+
+def upgrade(db):
+    create = """
+    CREATE TABLE IF NOT EXISTS daily_collections (
+        collection_date DATE NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        payment_count INT NOT NULL DEFAULT 0,
+        amount_total DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+        PRIMARY KEY (collection_date, status)
+    )
+    """
+    if db.execute_query(create) is None:
+        raise RuntimeError("Failed to create daily_collections")
+
+    # Rebuilt from scratch in one transaction, so the migration is safe to re-run
+    with db.transaction() as txn:
+        db.execute_query("DELETE FROM daily_collections")
+        db.execute_query("""
+        INSERT INTO daily_collections (collection_date, status, payment_count, amount_total)
+        SELECT due_date, status, COUNT(*), SUM(amount)
+        FROM (
+            SELECT due_date, status, amount FROM payments
+            UNION ALL
+            SELECT due_date, status, amount FROM payments_history
+        ) all_payments
+        GROUP BY due_date, status
+        """)
+    if txn.failed:
+        raise RuntimeError(f"Failed to backfill daily_collections: {txn.error}")
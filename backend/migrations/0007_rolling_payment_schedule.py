@@ -0,0 +1,35 @@
+"""
+Track how far each loan's payment schedule has been written to payments.
+With PAYMENT_SCHEDULE_WINDOW_DAYS set, funding only writes the next window
+of daily payments and the nightly extend_payment_schedules task writes the
+rest as the window moves; the schedule itself is derived from the loan's
+daily_payment and end_date. Existing loans were scheduled in full.
+"""
+from migrations import column_exists, create_index
+
+INDEXES = [
+    {
+        "table": "loans",
+        "name": "idx_loans_status_materialized",
+        "columns": ("status", "schedule_materialized_through"),
+        "query": "SELECT id FROM loans WHERE status = %s AND schedule_materialized_through < %s",
+        "params": ("active", "2024-01-01"),
+    },
+]
+
+
+def upgrade(db):
+    if not column_exists(db, 'loans', 'schedule_materialized_through'):
+        if db.execute_query("ALTER TABLE loans ADD COLUMN schedule_materialized_through DATE NULL") is None:
+            raise RuntimeError("Failed to add loans.schedule_materialized_through")
+
+    # The last due date of a full schedule is end_date. updated_at is kept
+    # as is, the archiver measures how long a loan has been closed from it
+    if db.execute_query("""
+        UPDATE loans SET schedule_materialized_through = end_date, updated_at = updated_at
+        WHERE schedule_materialized_through IS NULL
+    """) is None:
+        raise RuntimeError("Failed to backfill loans.schedule_materialized_through")
+
+    for index in INDEXES:
+        create_index(db, index["table"], index["name"], index["columns"])
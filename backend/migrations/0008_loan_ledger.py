@@ -0,0 +1,64 @@
+"""
+Append-only ledger of balance changes and per-loan balance snapshots. A
+loan's balance is its snapshot plus the ledger entries written after it, so
+payments only insert ledger rows instead of updating the loan row. Every
+loan starts with a snapshot of its current remaining_balance.
+"""
+from migrations import create_index
+
+INDEXES = [
+    {
+        # get_loan_balances: ledger tail of a loan after its snapshot
+        "table": "loan_ledger",
+        "name": "idx_loan_ledger_loan_id",
+        "columns": ("loan_id", "id"),
+        "query": "SELECT SUM(amount) FROM loan_ledger WHERE loan_id = %s AND id > %s",
+        "params": (0, 0),
+    },
+    {
+        # Entries written for a payment, to reverse them
+        "table": "loan_ledger",
+        "name": "idx_loan_ledger_payment_id",
+        "columns": ("payment_id", "entry_type"),
+        "query": "SELECT id FROM loan_ledger WHERE payment_id = %s AND entry_type = %s",
+        "params": (0, "payment"),
+    },
+]
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS loan_ledger (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        loan_id INT NOT NULL,
+        payment_id INT NULL,
+        entry_type VARCHAR(20) NOT NULL,
+        amount DECIMAL(12, 2) NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS loan_balance_snapshots (
+        loan_id INT NOT NULL PRIMARY KEY,
+        balance DECIMAL(12, 2) NOT NULL,
+        ledger_id INT NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+
+def upgrade(db):
+    for query in TABLES:
+        if db.execute_query(query) is None:
+            raise RuntimeError(f"Failed to run: {query.strip().splitlines()[0]}")
+
+    for index in INDEXES:
+        create_index(db, index["table"], index["name"], index["columns"])
+
+    # ledger_id 0 means no ledger entries are included yet
+    if db.execute_query("""
+        INSERT INTO loan_balance_snapshots (loan_id, balance, ledger_id)
+        SELECT id, remaining_balance, 0 FROM loans
+        WHERE id NOT IN (SELECT loan_id FROM loan_balance_snapshots)
+    """) is None:
+        raise RuntimeError("Failed to backfill loan_balance_snapshots")
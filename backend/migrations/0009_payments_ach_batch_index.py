@@ -0,0 +1,20 @@
+"""
+Index for the statements that work on the payments of one ACH batch
+(settle_ach_batch), which otherwise scan the whole payments table.
+"""
+from migrations import create_index
+
+INDEXES = [
+    {
+        "table": "payments",
+        "name": "idx_payments_ach_batch_status",
+        "columns": ("ach_batch_id", "status"),
+        "query": "SELECT id, loan_id, amount FROM payments WHERE ach_batch_id = %s AND status = 'processing'",
+        "params": (0,),
+    },
+]
+
+
+def upgrade(db):
+    for index in INDEXES:
+        create_index(db, index["table"], index["name"], index["columns"])
@@ -0,0 +1,20 @@
+"""
+Index for the paginated payment listing, which walks a loan's payments in
+(due_date, id) order from a cursor. payments_history has the same index.
+"""
+from migrations import create_index
+
+INDEXES = [
+    {
+        "table": "payments",
+        "name": "idx_payments_loan_due_date",
+        "columns": ("loan_id", "due_date"),
+        "query": "SELECT id FROM payments WHERE loan_id = %s AND due_date >= %s ORDER BY due_date, id LIMIT 100",
+        "params": (0, "2000-01-01"),
+    },
+]
+
+
+def upgrade(db):
+    for index in INDEXES:
+        create_index(db, index["table"], index["name"], index["columns"])
@@ -0,0 +1,13 @@
+"""
+When an ACH batch file was actually delivered (uploaded to SFTP or sent by
+hand). status 'processed' only means the file was generated; settlement
+waits for sent_at. Existing batches are left unsent: whether their files went
+out is not recorded, so they are marked by hand before they can settle.
+"""
+from migrations import column_exists
+
+
+def upgrade(db):
+    if not column_exists(db, 'ach_batches', 'sent_at'):
+        if db.execute_query("ALTER TABLE ach_batches ADD COLUMN sent_at TIMESTAMP NULL") is None:
+            raise RuntimeError("Failed to add ach_batches.sent_at")
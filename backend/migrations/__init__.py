@@ -0,0 +1,60 @@
+import importlib
+import os
+import re
+
+_MIGRATION_RE = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+
+def load_migrations():
+    """Return the migration modules in this package as (version, name, module), oldest first"""
+    found = []
+    for file_name in sorted(os.listdir(os.path.dirname(__file__))):
+        match = _MIGRATION_RE.match(file_name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{file_name[:-3]}")
+            found.append((match.group(1), match.group(2), module))
+    return found
+
+
+def index_columns(db, table, name):
+    """Columns of an index in order, or an empty list if it does not exist"""
+    if db.dialect == 'sqlite':
+        rows = db.fetch_all("SELECT name AS column_name FROM pragma_index_info(%s) ORDER BY seqno", (name,))
+    else:
+        rows = db.fetch_all("""
+            SELECT COLUMN_NAME AS column_name
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+            ORDER BY SEQ_IN_INDEX
+        """, (table, name))
+    return [row['column_name'] for row in rows]
+
+
+def column_exists(db, table, column):
+    if db.dialect == 'sqlite':
+        # table_xinfo also lists generated columns
+        rows = db.fetch_all("SELECT name FROM pragma_table_xinfo(%s) WHERE name = %s", (table, column))
+    else:
+        rows = db.fetch_all("""
+            SELECT COLUMN_NAME AS name
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """, (table, column))
+    return bool(rows)
+
+
+def create_index(db, table, name, columns):
+    """
+    Add an index unless it already exists. On MySQL the index is built
+    online (INPLACE, no lock) so writes to the table keep flowing.
+    """
+    if index_columns(db, table, name):
+        return False
+    column_list = ', '.join(columns)
+    if db.dialect == 'sqlite':
+        query = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column_list})"
+    else:
+        query = f"ALTER TABLE {table} ADD INDEX {name} ({column_list}), ALGORITHM=INPLACE, LOCK=NONE"
+    if db.execute_query(query) is None:
+        raise RuntimeError(f"Failed to create index {name} on {table}")
+    return True
@@ -0,0 +1,164 @@
+"""
+Optional monthly RANGE partitioning of payments by due_date (MySQL only).
+
+MySQL requires the partitioning column in every unique key and does not
+allow foreign keys on partitioned tables, so partitioning:
+  - drops the foreign keys payments.loan_id -> loans and
+    ach_transactions.payment_id -> payments (the indexes on those columns stay),
+  - changes the primary key to (id, due_date); id stays AUTO_INCREMENT and unique.
+
+Partitions are named pYYYYMM for a month and pYYYY for a whole year merged
+by maintain_partitions; pmax catches anything past the last month. Monthly
+partitions always reach the last due_date in the table, so pmax stays empty
+and splitting it is a metadata-only change.
+
+Lookups by id alone (get_payment_by_id, the per-payment status updates) can
+not be pruned and check every partition; queries that also filter on
+due_date read only the matching ones.
+"""
+import os
+from datetime import date
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Months of partitions kept ahead of today, at least as long as the longest
+# loan term so new schedules never land in pmax
+PAYMENTS_PARTITION_MONTHS_AHEAD = int(os.getenv('PAYMENTS_PARTITION_MONTHS_AHEAD', 24))
+# Monthly partitions older than this many months are merged into one partition per year
+PAYMENTS_PARTITION_MONTHLY_RETENTION = int(os.getenv('PAYMENTS_PARTITION_MONTHLY_RETENTION', 12))
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _monthly_partition(start):
+    return f"PARTITION p{start:%Y%m} VALUES LESS THAN ('{add_months(start, 1):%Y-%m-%d}')"
+
+
+def list_partitions(db):
+    """Partitions of payments as dicts with name and upper bound, in order; empty if not partitioned"""
+    return db.fetch_all("""
+        SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS upper_bound
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'payments' AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """)
+
+
+def _last_month(db, months_ahead):
+    """First day of the last month that needs its own partition: months_ahead from today or the last due date, whichever is later"""
+    last_month = add_months(month_start(date.today()), months_ahead)
+    bounds = db.fetch_one("SELECT MAX(due_date) AS last_due_date FROM payments")
+    if bounds and bounds['last_due_date']:
+        last_month = max(last_month, month_start(bounds['last_due_date']))
+    return last_month
+
+
+def _foreign_keys(db):
+    """(table, constraint) for the foreign keys that block partitioning payments"""
+    rows = db.fetch_all("""
+        SELECT TABLE_NAME AS table_name, CONSTRAINT_NAME AS constraint_name
+        FROM information_schema.REFERENTIAL_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = DATABASE()
+          AND (TABLE_NAME = 'payments' OR REFERENCED_TABLE_NAME = 'payments')
+    """)
+    return [(row['table_name'], row['constraint_name']) for row in rows]
+
+
+def _run(db, query):
+    if db.execute_query(query) is None:
+        raise RuntimeError(f"Failed to run: {query.strip().splitlines()[0]}")
+
+
+def partition_payments(db, months_ahead=PAYMENTS_PARTITION_MONTHS_AHEAD):
+    """Partition payments by month of due_date. Rebuilds the table; run in a maintenance window"""
+    if db.dialect != 'mysql':
+        logger.info("Partitioning is only supported on MySQL, skipping")
+        return False
+    if list_partitions(db):
+        logger.info("payments is already partitioned")
+        return False
+
+    for table, constraint in _foreign_keys(db):
+        logger.info(f"Dropping foreign key {constraint} on {table}")
+        _run(db, f"ALTER TABLE {table} DROP FOREIGN KEY {constraint}")
+
+    bounds = db.fetch_one("SELECT MIN(due_date) AS first_due_date FROM payments")
+    first_month = month_start(bounds['first_due_date'] if bounds and bounds['first_due_date'] else date.today())
+    last_month = _last_month(db, months_ahead)
+
+    partitions = []
+    current = first_month
+    while current <= last_month:
+        partitions.append(_monthly_partition(current))
+        current = add_months(current, 1)
+    partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+
+    logger.info(f"Partitioning payments into {len(partitions)} partitions")
+    _run(db, f"""
+        ALTER TABLE payments
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (id, due_date)
+        PARTITION BY RANGE COLUMNS(due_date) (
+            {', '.join(partitions)}
+        )
+    """)
+    return True
+
+
+def maintain_partitions(db, months_ahead=PAYMENTS_PARTITION_MONTHS_AHEAD,
+                        monthly_retention=PAYMENTS_PARTITION_MONTHLY_RETENTION):
+    """
+    Split pmax so there are monthly partitions for months_ahead months and
+    for every due date already in the table, and merge the monthly partitions of whole years older than
+    monthly_retention months into one partition per year.
+    Returns a summary of what changed.
+    """
+    summary = {"added": [], "merged": []}
+    if db.dialect != 'mysql':
+        return summary
+    partitions = list_partitions(db)
+    if not partitions:
+        return summary
+
+    names = [partition['name'] for partition in partitions]
+    monthly = sorted(name for name in names if len(name) == 7 and name[1:].isdigit())
+
+    # Future partitions: split pmax, which only holds rows past the last month
+    # (none while months_ahead covers the longest schedule)
+    last_month = date(int(monthly[-1][1:5]), int(monthly[-1][5:7]), 1) if monthly else month_start(date.today())
+    target = _last_month(db, months_ahead)
+    new_partitions = []
+    current = add_months(last_month, 1)
+    while current <= target:
+        new_partitions.append(_monthly_partition(current))
+        summary["added"].append(f"p{current:%Y%m}")
+        current = add_months(current, 1)
+    if new_partitions:
+        _run(db, f"""
+            ALTER TABLE payments REORGANIZE PARTITION pmax INTO (
+                {', '.join(new_partitions)},
+                PARTITION pmax VALUES LESS THAN (MAXVALUE)
+            )
+        """)
+
+    # Old partitions: merge each complete year before the retention cutoff
+    cutoff = add_months(month_start(date.today()), -monthly_retention)
+    years = sorted({name[1:5] for name in monthly if name[1:5] < f"{cutoff:%Y}"})
+    for year in years:
+        year_partitions = [name for name in monthly if name[1:5] == year]
+        _run(db, f"""
+            ALTER TABLE payments REORGANIZE PARTITION {', '.join(year_partitions)} INTO (
+                PARTITION p{year} VALUES LESS THAN ('{int(year) + 1}-01-01')
+            )
+        """)
+        summary["merged"].append(f"p{year}")
+
+    return summary
@@ -1,8 +1,9 @@
-from config.db import Database
+from config.db import Database, read_your_writes, DB_BULK_CHUNK_SIZE
 import logging
 from datetime import datetime, timedelta
 import json
 import os
+import base64
 from decimal import Decimal
 
 # Set up logging
@@ -12,90 +13,48 @@ logger = logging.getLogger(__name__)
 NACHA_IMMEDIATE_ORIGIN = os.getenv('NACHA_IMMEDIATE_ORIGIN', '1000000001')
 NACHA_ODFI_ID_SHORT = os.getenv('NACHA_ODFI_ID_SHORT', NACHA_IMMEDIATE_ORIGIN[1:9] if NACHA_IMMEDIATE_ORIGIN and len(NACHA_IMMEDIATE_ORIGIN) >=9 else '00000000')
 
+# Settled payments of loans closed for this many days move to payments_history
+PAYMENT_ARCHIVE_AFTER_DAYS = int(os.getenv('PAYMENT_ARCHIVE_AFTER_DAYS', 90))
+
+# Columns shared by payments and payments_history, so reads can span both
+PAYMENT_COLUMNS = "id, loan_id, amount, status, due_date, processed_at, ach_batch_id, ach_transaction_id, failure_reason, created_at, updated_at"
+ACH_TRANSACTION_COLUMNS = "id, batch_id, payment_id, status, trace_number, amount, failure_reason, processed_at, created_at, updated_at"
+
+# Days of daily payments written to payments ahead of today; the nightly
+# extend_payment_schedules task writes the rest. 0 writes the whole term at funding
+PAYMENT_SCHEDULE_WINDOW_DAYS = int(os.getenv('PAYMENT_SCHEDULE_WINDOW_DAYS', 0))
+
+# Ledger entries younger than this are left out of balance snapshots, so an
+# entry whose transaction commits late is never skipped by a snapshot
+LEDGER_SNAPSHOT_LAG_SECONDS = int(os.getenv('LEDGER_SNAPSHOT_LAG_SECONDS', 300))
+
+# Days after a batch date during which ACH debits can still come back as returns
+ACH_RETURN_WINDOW_DAYS = int(os.getenv('ACH_RETURN_WINDOW_DAYS', 2))
+
+# Page size of the payment listing
+PAYMENTS_PAGE_DEFAULT_LIMIT = 100
+PAYMENTS_PAGE_MAX_LIMIT = 500
+PAYMENT_STATUSES = ('scheduled', 'processing', 'completed', 'failed')
+
+
+def encode_payment_cursor(payment):
+    """Opaque cursor for the page after this payment: its (due_date, id)"""
+    key = f"{payment['due_date']:%Y-%m-%d}:{payment['id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_payment_cursor(cursor):
+    """(due_date, id) of a cursor; raises ValueError if it is malformed"""
+    try:
+        due_date, payment_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return datetime.strptime(due_date, '%Y-%m-%d').date(), int(payment_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
 class Loan:
     def __init__(self):
         self.db = Database()
-        self.create_tables()
-        
-    def create_tables(self):
-        # Create loans table if it doesn't exist
-        loans_query = """
-        CREATE TABLE IF NOT EXISTS loans (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            application_id INT NOT NULL,
-            user_id INT NOT NULL,
-            business_name VARCHAR(255) NOT NULL,
-            tax_id VARCHAR(50) NOT NULL,
-            status ENUM('active', 'closed', 'defaulted') DEFAULT 'active',
-            amount DECIMAL(10, 2) NOT NULL,
-            term_days INT NOT NULL,
-            interest_rate DECIMAL(5, 2) NOT NULL,
-            remaining_balance DECIMAL(10, 2) NOT NULL,
-            daily_payment DECIMAL(10, 2) NOT NULL,
-            start_date DATE NOT NULL,
-            end_date DATE NOT NULL,
-            funded_at TIMESTAMP NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            FOREIGN KEY (application_id) REFERENCES loan_applications(id),
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-        """
-        self.db.execute_query(loans_query)
         
-        # Create payments table if it doesn't exist
-        payments_query = """
-        CREATE TABLE IF NOT EXISTS payments (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            loan_id INT NOT NULL,
-            amount DECIMAL(10, 2) NOT NULL,
-            status ENUM('scheduled', 'processing', 'completed', 'failed') DEFAULT 'scheduled',
-            due_date DATE NOT NULL,
-            processed_at TIMESTAMP NULL,
-            ach_batch_id INT NULL,
-            ach_transaction_id VARCHAR(50) NULL,
-            failure_reason VARCHAR(255) NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            FOREIGN KEY (loan_id) REFERENCES loans(id)
-        )
-        """
-        self.db.execute_query(payments_query)
-        
-        # Create ach_batches table if it doesn't exist
-        ach_batches_query = """
-        CREATE TABLE IF NOT EXISTS ach_batches (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            status ENUM('pending', 'processed', 'completed') DEFAULT 'pending',
-            batch_date DATE NOT NULL,
-            file_name VARCHAR(255) NULL,
-            total_transactions INT NOT NULL DEFAULT 0,
-            total_amount DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-        """
-        self.db.execute_query(ach_batches_query)
-        
-        # Create ach_transactions table if it doesn't exist
-        ach_transactions_query = """
-        CREATE TABLE IF NOT EXISTS ach_transactions (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            batch_id INT NOT NULL,
-            payment_id INT NOT NULL,
-            status ENUM('pending', 'processed', 'failed', 'returned') DEFAULT 'pending',
-            trace_number VARCHAR(50) NULL,
-            amount DECIMAL(10, 2) NOT NULL,
-            failure_reason VARCHAR(255) NULL,
-            processed_at TIMESTAMP NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            FOREIGN KEY (batch_id) REFERENCES ach_batches(id),
-            FOREIGN KEY (payment_id) REFERENCES payments(id)
-        )
-        """
-        self.db.execute_query(ach_transactions_query)
-    
     # Helper method to convert Decimal objects to float for JSON serialization
     def _convert_decimal_to_float(self, data):
         if isinstance(data, list):
@@ -106,6 +65,7 @@ class Loan:
             return float(data)
         return data
 
+    @read_your_writes()
     def create_loan(self, data):
         try:
             # Extract loan data
@@ -145,15 +105,25 @@ class Loan:
             ) 
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
             """
-            loan_id = self.db.insert(query, (
-                application_id, user_id, business_name, tax_id,
-                amount, term_days, interest_rate, remaining_balance, daily_payment,
-                start_date, end_date
-            ))
+            # The loan and its payment schedule are committed together
+            with self.db.transaction() as txn:
+                loan_id = self.db.insert(query, (
+                    application_id, user_id, business_name, tax_id,
+                    amount, term_days, interest_rate, remaining_balance, daily_payment,
+                    start_date, end_date
+                ))
+                
+                if loan_id:
+                    # The opening balance; payments are applied through loan_ledger
+                    self.db.execute_query(
+                        "INSERT INTO loan_balance_snapshots (loan_id, balance, ledger_id) VALUES (%s, %s, 0)",
+                        (loan_id, remaining_balance)
+                    )
+                
+                if loan_id and not self.create_payment_schedule(loan_id, start_date, term_days, daily_payment):
+                    raise Exception(f"Error creating payment schedule for loan {loan_id}")
             
-            if loan_id:
-                # Create payment schedule
-                self.create_payment_schedule(loan_id, start_date, term_days, daily_payment)
+            if loan_id and not txn.failed:
                 logger.info(f"Loan created with ID: {loan_id}")
                 return self.get_loan_by_id(loan_id)
             
@@ -164,28 +134,112 @@ class Loan:
     
     def create_payment_schedule(self, loan_id, start_date, term_days, daily_payment):
         try:
-            # Create a payment entry for each day in the term
-            due_date = start_date
-            for _ in range(term_days):
-                due_date = due_date + timedelta(days=1)
-                query = """
-                INSERT INTO payments (loan_id, amount, due_date, status)
-                VALUES (%s, %s, %s, 'scheduled')
-                """
-                self.db.insert(query, (loan_id, daily_payment, due_date))
-            
-            logger.info(f"Created payment schedule for loan {loan_id}")
+            # Only the first PAYMENT_SCHEDULE_WINDOW_DAYS are written when a window is set
+            end_date = start_date + timedelta(days=term_days)
+            through = end_date
+            if PAYMENT_SCHEDULE_WINDOW_DAYS:
+                through = min(end_date, start_date + timedelta(days=PAYMENT_SCHEDULE_WINDOW_DAYS))
+            result = self._materialize_schedules([(loan_id, daily_payment, start_date, through)])
+            if 'error' in result:
+                logger.error(f"Error creating payment schedule for loan {loan_id}: {result['error']}")
+                return False
+
+            logger.info(f"Created payment schedule for loan {loan_id} ({result['payments']} payments through {through})")
             return True
         except Exception as e:
             logger.error(f"Error creating payment schedule for loan {loan_id}: {str(e)}")
             return False
+
+    def _materialize_schedules(self, segments):
+        """
+        Write the daily payments of each (loan_id, daily_payment, after, through)
+        segment, due after `after` up to and including `through`, in a few
+        multi-row inserts, and move the loans' schedule_materialized_through.
+        """
+        rows = []
+        for loan_id, daily_payment, after, through in segments:
+            # Rounded here as DECIMAL(10, 2) would store it, so the counters add up to the rows
+            amount = round(daily_payment, 2)
+            rows.extend(
+                (loan_id, amount, after + timedelta(days=day), 'scheduled')
+                for day in range(1, (through - after).days + 1)
+            )
+        with self.db.transaction() as txn:
+            result = self.db.insert_many('payments', ('loan_id', 'amount', 'due_date', 'status'), rows)
+            if 'error' not in result:
+                self.record_payment_transitions([(loan_id, due_date, None, 'scheduled', amount, 1) for loan_id, amount, due_date, _ in rows])
+                # One UPDATE for all the loans; updated_at is left alone, this is bookkeeping rather than a change to the loan
+                self.db.update_many(
+                    'loans', 'id', ('schedule_materialized_through',),
+                    [(loan_id, through) for loan_id, _, _, through in segments],
+                    keep_columns=('updated_at',)
+                )
+        if 'error' in result or txn.failed:
+            return {"error": result.get('error', txn.error)}
+        return {"payments": result['rowcount']}
+
+    def extend_payment_schedules(self, window_days=None, chunk_size=None):
+        """
+        Write the scheduled payments of active loans up to window_days
+        (PAYMENT_SCHEDULE_WINDOW_DAYS by default) ahead of today. Loans are
+        handled in chunks of chunk_size, each in its own transaction.
+        """
+        window_days = PAYMENT_SCHEDULE_WINDOW_DAYS if window_days is None else window_days
+        chunk_size = chunk_size or DB_BULK_CHUNK_SIZE
+        result = {"loans": 0, "payments": 0}
+        if not window_days:
+            # Without a window schedules are written in full at funding
+            return result
+        horizon = datetime.now().date() + timedelta(days=window_days)
+        last_id = 0
+        try:
+            while True:
+                with self.db.transaction() as txn:
+                    loans = self.db.fetch_all("""
+                    SELECT id, daily_payment, end_date, schedule_materialized_through
+                    FROM loans
+                    WHERE status = 'active' AND id > %s
+                      AND schedule_materialized_through < end_date
+                      AND schedule_materialized_through < %s
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE
+                    """, (last_id, horizon, chunk_size))
+                    if not loans:
+                        break
+
+                    segments = [
+                        (loan['id'], loan['daily_payment'], loan['schedule_materialized_through'], min(loan['end_date'], horizon))
+                        for loan in loans
+                    ]
+                    written = self._materialize_schedules(segments)
+                    if 'error' in written:
+                        raise Exception(written['error'])
+
+                if txn.failed:
+                    result["error"] = f"Error extending payment schedules: {txn.error}"
+                    break
+                result["loans"] += len(loans)
+                result["payments"] += written["payments"]
+                last_id = loans[-1]['id']
+                if len(loans) < chunk_size:
+                    break
+
+            logger.info(f"Extended payment schedules of {result['loans']} loans with {result['payments']} payments through {horizon}")
+            return result
+        except Exception as e:
+            logger.error(f"Error extending payment schedules: {str(e)}")
+            result["error"] = f"Error extending payment schedules: {str(e)}"
+            return result
     
     def get_loan_by_id(self, loan_id):
         try:
             query = """
             SELECT * FROM loans WHERE id = %s
             """
-            loan = self.db.fetch_one(query, (loan_id,))
+            loan = self.db.fetch_one(query, (loan_id,), prepared=True)
+            if loan:
+                self._apply_ledger_balances([loan])
             return self._convert_decimal_to_float(loan)
         except Exception as e:
             logger.error(f"Error getting loan {loan_id}: {str(e)}")
@@ -197,6 +251,7 @@ class Loan:
             SELECT * FROM loans WHERE user_id = %s
             """
             loans = self.db.fetch_all(query, (user_id,))
+            self._apply_ledger_balances(loans)
             return self._convert_decimal_to_float(loans)
         except Exception as e:
             logger.error(f"Error getting loan {user_id}: {str(e)}")
@@ -208,24 +263,120 @@ class Loan:
             SELECT * FROM loans WHERE user_id = %s
             """
             loans = self.db.fetch_all(query, (user_id,))
+            self._apply_ledger_balances(loans)
             return self._convert_decimal_to_float(loans)
         except Exception as e:
             logger.error(f"Error getting loans for user {user_id}: {str(e)}")
             return []
     
-    def get_loan_payments(self, loan_id):
+    def _apply_ledger_balances(self, loans):
+        # loans.remaining_balance is only refreshed by snapshot_loan_balances
+        balances = self.get_loan_balances([loan['id'] for loan in loans])
+        for loan in loans:
+            if loan['id'] in balances:
+                loan['remaining_balance'] = balances[loan['id']]
+    
+    def get_loan_balances(self, loan_ids):
+        """Current balance of each loan, from its snapshot plus the ledger entries after it"""
+        if not loan_ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(loan_ids))
+        rows = self.db.fetch_all(f"""
+        SELECT s.loan_id, ROUND(s.balance + COALESCE(SUM(e.amount), 0), 2) AS balance
+        FROM loan_balance_snapshots s
+        LEFT JOIN loan_ledger e ON e.loan_id = s.loan_id AND e.id > s.ledger_id
+        WHERE s.loan_id IN ({placeholders})
+        GROUP BY s.loan_id, s.balance
+        """, tuple(loan_ids))
+        return {row['loan_id']: row['balance'] for row in rows}
+    
+    def record_ledger_entries(self, entries):
+        """
+        Append (loan_id, payment_id, entry_type, amount) entries to loan_ledger.
+        amount is the change to the balance: negative for payments, positive
+        for reversals. Runs inside the caller's transaction.
+        """
+        return self.db.insert_many('loan_ledger', ('loan_id', 'payment_id', 'entry_type', 'amount'), entries)
+    
+    def snapshot_loan_balances(self, chunk_size=None):
+        """
+        Fold the ledger entries older than LEDGER_SNAPSHOT_LAG_SECONDS into
+        the snapshot of each loan, keeping balance reads to a short tail, and
+        copy the balance to loans.remaining_balance. Each chunk of loans is
+        updated in its own transaction.
+        """
+        chunk_size = chunk_size or DB_BULK_CHUNK_SIZE
+        cutoff = datetime.now() - timedelta(seconds=LEDGER_SNAPSHOT_LAG_SECONDS)
+        result = {"loans": 0, "chunks": 0}
+        last_loan_id = 0
+        try:
+            while True:
+                with self.db.transaction() as txn:
+                    rows = self.db.fetch_all("""
+                    SELECT s.loan_id, ROUND(s.balance + SUM(e.amount), 2) AS balance, MAX(e.id) AS ledger_id
+                    FROM loan_balance_snapshots s
+                    JOIN loan_ledger e ON e.loan_id = s.loan_id AND e.id > s.ledger_id
+                    WHERE s.loan_id > %s AND e.created_at < %s
+                    GROUP BY s.loan_id, s.balance
+                    ORDER BY s.loan_id
+                    LIMIT %s
+                    """, (last_loan_id, cutoff, chunk_size))
+                    if not rows:
+                        break
+
+                    # One UPDATE per table for the whole chunk
+                    snapshot_at = datetime.now().replace(microsecond=0)
+                    self.db.update_many(
+                        'loan_balance_snapshots', 'loan_id', ('balance', 'ledger_id', 'created_at'),
+                        [(row['loan_id'], row['balance'], row['ledger_id'], snapshot_at) for row in rows]
+                    )
+                    # updated_at is left alone, the archiver measures how long a loan has been closed from it
+                    self.db.update_many(
+                        'loans', 'id', ('remaining_balance',),
+                        [(row['loan_id'], row['balance']) for row in rows],
+                        keep_columns=('updated_at',)
+                    )
+
+                if txn.failed:
+                    result["error"] = f"Error snapshotting loan balances: {txn.error}"
+                    break
+                result["loans"] += len(rows)
+                result["chunks"] += 1
+                last_loan_id = rows[-1]['loan_id']
+                if len(rows) < chunk_size:
+                    break
+
+            logger.info(f"Snapshotted the balances of {result['loans']} loans in {result['chunks']} chunks")
+            return result
+        except Exception as e:
+            logger.error(f"Error snapshotting loan balances: {str(e)}")
+            result["error"] = f"Error snapshotting loan balances: {str(e)}"
+            return result
+    
+    def get_loan_payments(self, loan_id, include_history=False):
         try:
-            query = """
-            SELECT * FROM payments 
-            WHERE loan_id = %s
-            ORDER BY due_date ASC
-            """
-            payments = self.db.fetch_all(query, (loan_id,))
+            if include_history:
+                # Archived payments live in payments_history; read both stores in one query
+                query = f"""
+                SELECT {PAYMENT_COLUMNS} FROM payments WHERE loan_id = %s
+                UNION ALL
+                SELECT {PAYMENT_COLUMNS} FROM payments_history WHERE loan_id = %s
+                ORDER BY due_date ASC
+                """
+                payments = self.db.fetch_all(query, (loan_id, loan_id))
+            else:
+                query = """
+                SELECT * FROM payments 
+                WHERE loan_id = %s
+                ORDER BY due_date ASC
+                """
+                payments = self.db.fetch_all(query, (loan_id,))
             return self._convert_decimal_to_float(payments)
         except Exception as e:
             logger.error(f"Error getting payments for loan {loan_id}: {str(e)}")
             return []
     
+    @read_your_writes()
     def update_loan_status(self, loan_id, status):
         try:
             query = """
@@ -239,6 +390,7 @@ class Loan:
             logger.error(f"Error updating status for loan {loan_id}: {str(e)}")
             return {"error": f"Error updating loan status: {str(e)}"}
     
+    @read_your_writes()
     def update_payment_status(self, payment_id, status, failure_reason=None):
         try:
             query = """
@@ -247,23 +399,188 @@ class Loan:
             WHERE id = %s
             """
             processed_at = datetime.now() if status in ['completed', 'failed'] else None
-            self.db.execute_query(query, (status, failure_reason, processed_at, payment_id))
-            
-            # If payment completed, update loan remaining balance
-            if status == 'completed':
-                self.update_loan_balance_after_payment(payment_id)
+            with self.db.transaction():
+                # Lock the row so the counters move from the status it really had
+                previous = self.db.fetch_one(
+                    "SELECT loan_id, amount, status, due_date FROM payments WHERE id = %s FOR UPDATE", (payment_id,)
+                )
+                self.db.execute_query(query, (status, failure_reason, processed_at, payment_id))
+                if previous and previous['status'] != status:
+                    self.record_payment_transitions([
+                        (previous['loan_id'], previous['due_date'], previous['status'], status, previous['amount'], 1)
+                    ])
+                
+                # If payment completed, update loan remaining balance once
+                if status == 'completed' and previous and previous['status'] != 'completed':
+                    self.update_loan_balance_after_payment(payment_id)
+                # A completed payment that is returned gives its amount back to the balance
+                elif previous and previous['status'] == 'completed' and status != 'completed':
+                    self.record_ledger_entries([(previous['loan_id'], payment_id, 'reversal', previous['amount'])])
+                    self.db.execute_query("UPDATE loans SET status = 'active' WHERE id = %s AND status = 'closed'", (previous['loan_id'],))
             
             return self.get_payment_by_id(payment_id)
         except Exception as e:
             logger.error(f"Error updating status for payment {payment_id}: {str(e)}")
             return {"error": f"Error updating payment status: {str(e)}"}
     
+    def record_payment_transitions(self, transitions):
+        """
+        Move payments between the per-status counters in loan_payment_stats
+        and daily_collections. Each transition is
+        (loan_id, due_date, from_status, to_status, amount, count);
+        from_status is None for new payments. Runs inside the caller's
+        transaction so the counters commit with the payment rows.
+        """
+        loan_deltas = {}
+        daily_deltas = {}
+        for loan_id, due_date, from_status, to_status, amount, count in transitions:
+            for status, sign in ((from_status, -1), (to_status, 1)):
+                if not status:
+                    continue
+                for deltas, key in ((loan_deltas, (loan_id, status)), (daily_deltas, (due_date, status))):
+                    payment_count, amount_total = deltas.get(key, (0, 0))
+                    deltas[key] = (payment_count + sign * count, amount_total + sign * amount)
+
+        with self.db.transaction():
+            if loan_deltas:
+                self.db.upsert_increment(
+                    'loan_payment_stats', ('loan_id', 'status'), ('payment_count', 'amount_total'),
+                    [key + value for key, value in loan_deltas.items()]
+                )
+            if daily_deltas:
+                self.db.upsert_increment(
+                    'daily_collections', ('collection_date', 'status'), ('payment_count', 'amount_total'),
+                    [key + value for key, value in daily_deltas.items()]
+                )
+    
+    def rebuild_daily_collections(self, start_date=None, end_date=None):
+        """
+        Recompute daily_collections from payments and payments_history for
+        due dates in [start_date, end_date] (the whole table by default).
+        """
+        try:
+            conditions = []
+            params = []
+            if start_date:
+                conditions.append("collection_date >= %s")
+                params.append(start_date)
+            if end_date:
+                conditions.append("collection_date <= %s")
+                params.append(end_date)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            due_date_where = where.replace("collection_date", "due_date")
+            
+            with self.db.transaction() as txn:
+                self.db.execute_query(f"DELETE FROM daily_collections {where}", tuple(params))
+                result = self.db.execute_query(f"""
+                INSERT INTO daily_collections (collection_date, status, payment_count, amount_total)
+                SELECT due_date, status, COUNT(*), SUM(amount)
+                FROM (
+                    SELECT due_date, status, amount FROM payments {due_date_where}
+                    UNION ALL
+                    SELECT due_date, status, amount FROM payments_history {due_date_where}
+                ) all_payments
+                GROUP BY due_date, status
+                """, tuple(params) * 2)
+            
+            if txn.failed:
+                return {"error": f"Error rebuilding daily collections: {txn.error}"}
+            return {"rows": result.rowcount if result else 0}
+        except Exception as e:
+            logger.error(f"Error rebuilding daily collections: {str(e)}")
+            return {"error": f"Error rebuilding daily collections: {str(e)}"}
+    
+    def get_daily_collections(self, start_date, end_date, user_id=None):
+        """
+        Per-day payment counts and amounts by status. Platform-wide totals come
+        from the daily_collections rollup; with user_id they are computed from
+        the payments of that user's loans only.
+        """
+        try:
+            if user_id is None:
+                query = """
+                SELECT collection_date, status, payment_count, amount_total
+                FROM daily_collections
+                WHERE collection_date BETWEEN %s AND %s AND payment_count <> 0
+                ORDER BY collection_date ASC, status ASC
+                """
+                rows = self.db.fetch_all(query, (start_date, end_date))
+            else:
+                query = """
+                SELECT collection_date, status, SUM(payment_count) AS payment_count, SUM(amount_total) AS amount_total
+                FROM (
+                    SELECT p.due_date AS collection_date, p.status, COUNT(*) AS payment_count, SUM(p.amount) AS amount_total
+                    FROM payments p JOIN loans l ON l.id = p.loan_id
+                    WHERE l.user_id = %s AND p.due_date BETWEEN %s AND %s
+                    GROUP BY p.due_date, p.status
+                    UNION ALL
+                    SELECT p.due_date AS collection_date, p.status, COUNT(*) AS payment_count, SUM(p.amount) AS amount_total
+                    FROM payments_history p JOIN loans l ON l.id = p.loan_id
+                    WHERE l.user_id = %s AND p.due_date BETWEEN %s AND %s
+                    GROUP BY p.due_date, p.status
+                ) user_payments
+                GROUP BY collection_date, status
+                ORDER BY collection_date ASC, status ASC
+                """
+                rows = self.db.fetch_all(query, (user_id, start_date, end_date) * 2)
+            days = {}
+            for row in rows:
+                # str() because SQLite returns a date selected through a subquery as text
+                collection_date = str(row['collection_date'])[:10]
+                day = days.setdefault(collection_date, {"date": collection_date})
+                day[row['status']] = {"count": row['payment_count'], "amount": float(row['amount_total'])}
+            return list(days.values())
+        except Exception as e:
+            logger.error(f"Error getting daily collections: {str(e)}")
+            return []
+    
+    def get_payment_summary(self, loan_id):
+        """Payment counts and amounts per status for a loan, read from loan_payment_stats"""
+        try:
+            query = """
+            SELECT status, payment_count, amount_total
+            FROM loan_payment_stats
+            WHERE loan_id = %s
+            """
+            rows = self.db.fetch_all(query, (loan_id,))
+            summary = {"total": 0, "completed": 0, "scheduled": 0, "processing": 0, "failed": 0, "amounts": {}}
+            for row in rows:
+                summary[row['status']] = row['payment_count']
+                summary["amounts"][row['status']] = float(row['amount_total'])
+                summary["total"] += row['payment_count']
+            return summary
+        except Exception as e:
+            logger.error(f"Error getting payment summary for loan {loan_id}: {str(e)}")
+            return None
+    
+    def count_payments_for_user(self, user_id, status=None):
+        """
+        Number of payments of a user's loans, optionally with one status,
+        summed from loan_payment_stats. Archived payments are included.
+        """
+        try:
+            query = """
+            SELECT COALESCE(SUM(s.payment_count), 0) AS total
+            FROM loan_payment_stats s
+            JOIN loans l ON l.id = s.loan_id
+            WHERE l.user_id = %s
+            """
+            params = [user_id]
+            if status:
+                query += " AND s.status = %s"
+                params.append(status)
+            row = self.db.fetch_one(query, tuple(params))
+            return int(row['total']) if row else 0
+        except Exception as e:
+            logger.error(f"Error counting payments for user {user_id}: {str(e)}")
+            return None
+    
     def get_payment_by_id(self, payment_id):
         try:
             query = """
             SELECT * FROM payments WHERE id = %s
             """
-            payment = self.db.fetch_one(query, (payment_id,))
+            payment = self.db.fetch_one(query, (payment_id,), prepared=True)
             return self._convert_decimal_to_float(payment)
         except Exception as e:
             logger.error(f"Error getting payment {payment_id}: {str(e)}")
@@ -271,84 +588,89 @@ class Loan:
     
     def update_loan_balance_after_payment(self, payment_id):
         try:
-            # Get payment amount and loan_id
-            query = "SELECT loan_id, amount FROM payments WHERE id = %s"
-            payment = self.db.fetch_one(query, (payment_id,))
-            
-            if not payment:
-                return False
+            with self.db.transaction() as txn:
+                # Get payment amount and loan_id
+                query = "SELECT loan_id, amount FROM payments WHERE id = %s"
+                payment = self.db.fetch_one(query, (payment_id,), prepared=True)
                 
-            loan_id = payment['loan_id']
-            payment_amount = payment['amount']
-            
-            # Update loan remaining balance
-            query = """
-            UPDATE loans 
-            SET remaining_balance = remaining_balance - %s
-            WHERE id = %s
-            """
-            self.db.execute_query(query, (payment_amount, loan_id))
-            
-            # Check if loan is paid off
-            loan = self.get_loan_by_id(loan_id)
-            if loan and loan['remaining_balance'] <= 0:
-                self.update_loan_status(loan_id, 'closed')
+                if not payment:
+                    return False
+                    
+                loan_id = payment['loan_id']
                 
-            return True
+                # Appended to the ledger rather than updating the loan row
+                self.record_ledger_entries([(loan_id, payment_id, 'payment', -payment['amount'])])
+                
+                # Check if loan is paid off
+                balance = self.get_loan_balances([loan_id]).get(loan_id)
+                if balance is not None and balance <= 0:
+                    self.update_loan_status(loan_id, 'closed')
+                
+            return not txn.failed
         except Exception as e:
             logger.error(f"Error updating loan balance after payment {payment_id}: {str(e)}")
             return False
     
+    @read_your_writes()
     def create_ach_batch(self, batch_date=None):
         try:
             if not batch_date:
                 batch_date = datetime.now().date()
-                
-            # Create new ACH batch
-            query = """
-            INSERT INTO ach_batches (batch_date, status)
-            VALUES (%s, 'pending')
-            """
-            batch_id = self.db.insert(query, (batch_date,))
             
-            # Get all scheduled payments due on batch_date
-            payments_query = """
-            SELECT id, loan_id, amount 
-            FROM payments 
-            WHERE due_date = %s AND status = 'scheduled'
-            """
-            payments = self.db.fetch_all(payments_query, (batch_date,))
-            
-            total_amount = 0
-            total_transactions = 0
+            # Trace number: ODFI id followed by the payment id padded to 7 digits (longer ids are kept whole)
+            if self.db.dialect == 'sqlite':
+                trace_number = "%s || substr('0000000' || p.id, -max(7, length(p.id)))"
+            else:
+                trace_number = "CONCAT(%s, LPAD(p.id, GREATEST(7, CHAR_LENGTH(p.id)), '0'))"
             
-            # Create ACH transactions for each payment
-            for payment in payments:
-                # Update payment status to processing
-                self.update_payment_status(payment['id'], 'processing')
+            # The batch, its transactions and the payment status changes are committed together,
+            # each written with one statement for the whole batch
+            with self.db.transaction() as txn:
+                # Create new ACH batch
+                query = """
+                INSERT INTO ach_batches (batch_date, status)
+                VALUES (%s, 'pending')
+                """
+                batch_id = self.db.insert(query, (batch_date,))
+                
+                # Claim all scheduled payments due on batch_date for this batch
+                self.db.execute_query("""
+                UPDATE payments
+                SET status = 'processing', ach_batch_id = %s, failure_reason = NULL, processed_at = NULL
+                WHERE due_date = %s AND status = 'scheduled'
+                """, (batch_id, batch_date))
                 
-                trace_number = f"{NACHA_ODFI_ID_SHORT}{str(payment['id']).zfill(7)}"
-                # Create ACH transaction
-                transaction_query = """
+                # Create an ACH transaction for each claimed payment
+                self.db.execute_query(f"""
                 INSERT INTO ach_transactions (batch_id, payment_id, amount, status, trace_number)
-                VALUES (%s, %s, %s, 'pending', %s)
-                """
-                self.db.insert(transaction_query, (
-                    batch_id, payment['id'], payment['amount'], trace_number
-                ))
+                SELECT %s, p.id, p.amount, 'pending', {trace_number}
+                FROM payments p
+                WHERE p.due_date = %s AND p.status = 'processing' AND p.ach_batch_id = %s
+                """, (batch_id, NACHA_ODFI_ID_SHORT, batch_date, batch_id))
+                
+                # Move the claimed payments between the counters, one transition per loan
+                per_loan = self.db.fetch_all("""
+                SELECT loan_id, COUNT(*) AS payment_count, SUM(amount) AS amount_total
+                FROM payments
+                WHERE due_date = %s AND status = 'processing' AND ach_batch_id = %s
+                GROUP BY loan_id
+                """, (batch_date, batch_id))
+                self.record_payment_transitions([
+                    (row['loan_id'], batch_date, 'scheduled', 'processing', row['amount_total'], row['payment_count'])
+                    for row in per_loan
+                ])
                 
-                total_amount += float(payment['amount'])
-                total_transactions += 1
+                # Update batch with totals
+                update_query = """
+                UPDATE ach_batches 
+                SET total_transactions = (SELECT COUNT(*) FROM ach_transactions WHERE batch_id = %s),
+                    total_amount = (SELECT COALESCE(SUM(amount), 0) FROM ach_transactions WHERE batch_id = %s)
+                WHERE id = %s
+                """
+                self.db.execute_query(update_query, (batch_id, batch_id, batch_id))
             
-            # Update batch with totals
-            update_query = """
-            UPDATE ach_batches 
-            SET total_transactions = %s, total_amount = %s
-            WHERE id = %s
-            """
-            self.db.execute_query(update_query, (
-                total_transactions, total_amount, batch_id
-            ))
+            if txn.failed:
+                return {"error": f"Error creating ACH batch: {txn.error}"}
             
             return self.get_ach_batch(batch_id)
         except Exception as e:
@@ -366,45 +688,363 @@ class Loan:
             logger.error(f"Error getting ACH batch {batch_id}: {str(e)}")
             return None
     
+    def mark_ach_batch_sent(self, batch_id):
+        """Record that a generated batch file was delivered; only sent batches are settled"""
+        try:
+            updated = self.db.execute_query("""
+            UPDATE ach_batches SET sent_at = NOW()
+            WHERE id = %s AND status = 'processed' AND sent_at IS NULL
+            """, (batch_id,))
+            if not updated or not updated.rowcount:
+                return {"error": f"ACH batch {batch_id} not found, without a generated file, or already sent"}
+            return self.get_ach_batch(batch_id)
+        except Exception as e:
+            logger.error(f"Error marking ACH batch {batch_id} as sent: {str(e)}")
+            return {"error": f"Error marking ACH batch as sent: {str(e)}"}
+
+    def release_ach_transactions(self, batch_id, skipped):
+        """
+        Take the entries that were left out of a batch's file back out of the
+        batch, so settling it cannot complete them: their ACH transactions are
+        marked failed with the reason and their payments go back to scheduled.
+        skipped is a list of (transaction_id, reason). The batch totals are
+        recomputed from the entries that remain.
+        """
+        try:
+            if not skipped:
+                return {"released": 0}
+
+            with self.db.transaction() as txn:
+                self.db.update_many(
+                    'ach_transactions', 'id', ('status', 'failure_reason'),
+                    [(transaction_id, 'failed', reason[:255]) for transaction_id, reason in skipped]
+                )
+
+                # Entries of a batch only fail before its file is sent, returns come later
+                per_loan = self.db.fetch_all("""
+                SELECT loan_id, due_date, COUNT(*) AS payment_count, SUM(amount) AS amount_total
+                FROM payments
+                WHERE ach_batch_id = %s AND status = 'processing' AND id IN (
+                    SELECT payment_id FROM ach_transactions WHERE batch_id = %s AND status = 'failed'
+                )
+                GROUP BY loan_id, due_date
+                """, (batch_id, batch_id))
+                released = self.db.execute_query("""
+                UPDATE payments
+                SET status = 'scheduled', ach_batch_id = NULL
+                WHERE ach_batch_id = %s AND status = 'processing' AND id IN (
+                    SELECT payment_id FROM ach_transactions WHERE batch_id = %s AND status = 'failed'
+                )
+                """, (batch_id, batch_id))
+                self.record_payment_transitions([
+                    (row['loan_id'], row['due_date'], 'processing', 'scheduled', row['amount_total'], row['payment_count'])
+                    for row in per_loan
+                ])
+
+                self.db.execute_query("""
+                UPDATE ach_batches
+                SET total_transactions = (SELECT COUNT(*) FROM ach_transactions WHERE batch_id = %s AND status = 'pending'),
+                    total_amount = (SELECT COALESCE(SUM(amount), 0) FROM ach_transactions WHERE batch_id = %s AND status = 'pending')
+                WHERE id = %s
+                """, (batch_id, batch_id, batch_id))
+
+            if txn.failed:
+                return {"error": f"Error releasing ACH transactions of batch {batch_id}: {txn.error}"}
+
+            logger.info(f"Released {len(skipped)} ACH transactions left out of the file of batch {batch_id}")
+            return {"released": released.rowcount if released else 0}
+        except Exception as e:
+            logger.error(f"Error releasing ACH transactions of batch {batch_id}: {str(e)}")
+            return {"error": f"Error releasing ACH transactions of batch {batch_id}: {str(e)}"}
+
+    def settle_ach_batch(self, batch_id):
+        """
+        Complete every payment of a sent batch whose entry went into the file
+        and was not returned, in one transaction and with one statement per
+        step: the ledger entries, the payment and ACH transaction statuses,
+        the counters and the closing of loans the batch paid off.
+        """
+        try:
+            with self.db.transaction() as txn:
+                batch = self.db.fetch_one("SELECT id, status, sent_at FROM ach_batches WHERE id = %s FOR UPDATE", (batch_id,))
+                if not batch:
+                    return {"error": f"ACH batch {batch_id} not found"}
+                if batch['status'] != 'processed':
+                    return {"error": f"ACH batch {batch_id} is {batch['status']}, only processed batches can be settled"}
+                if not batch['sent_at']:
+                    return {"error": f"ACH batch {batch_id} was never sent, it cannot be settled"}
+
+                per_loan = self.db.fetch_all("""
+                SELECT loan_id, due_date, COUNT(*) AS payment_count, SUM(amount) AS amount_total
+                FROM payments
+                WHERE ach_batch_id = %s AND status = 'processing' AND id IN (
+                    SELECT payment_id FROM ach_transactions WHERE batch_id = %s AND status = 'pending'
+                )
+                GROUP BY loan_id, due_date
+                """, (batch_id, batch_id))
+
+                # Balance reductions, one ledger entry per payment so returns can reverse them
+                self.db.execute_query("""
+                INSERT INTO loan_ledger (loan_id, payment_id, entry_type, amount)
+                SELECT loan_id, id, 'payment', -amount
+                FROM payments
+                WHERE ach_batch_id = %s AND status = 'processing' AND id IN (
+                    SELECT payment_id FROM ach_transactions WHERE batch_id = %s AND status = 'pending'
+                )
+                """, (batch_id, batch_id))
+                completed = self.db.execute_query("""
+                UPDATE payments
+                SET status = 'completed', processed_at = NOW()
+                WHERE ach_batch_id = %s AND status = 'processing' AND id IN (
+                    SELECT payment_id FROM ach_transactions WHERE batch_id = %s AND status = 'pending'
+                )
+                """, (batch_id, batch_id))
+                self.db.execute_query("""
+                UPDATE ach_transactions
+                SET status = 'processed', processed_at = NOW()
+                WHERE batch_id = %s AND status = 'pending'
+                """, (batch_id,))
+                self.record_payment_transitions([
+                    (row['loan_id'], row['due_date'], 'processing', 'completed', row['amount_total'], row['payment_count'])
+                    for row in per_loan
+                ])
+
+                # Close the loans of this batch whose balance (snapshot plus ledger tail) is paid off
+                closed = self.db.execute_query("""
+                UPDATE loans
+                SET status = 'closed'
+                WHERE status = 'active' AND id IN (
+                    SELECT s.loan_id
+                    FROM loan_balance_snapshots s
+                    LEFT JOIN loan_ledger e ON e.loan_id = s.loan_id AND e.id > s.ledger_id
+                    WHERE s.loan_id IN (SELECT loan_id FROM payments WHERE ach_batch_id = %s)
+                    GROUP BY s.loan_id, s.balance
+                    HAVING s.balance + COALESCE(SUM(e.amount), 0) <= 0
+                )
+                """, (batch_id,))
+                self.db.execute_query("UPDATE ach_batches SET status = 'completed' WHERE id = %s", (batch_id,))
+
+            if txn.failed:
+                return {"error": f"Error settling ACH batch {batch_id}: {txn.error}"}
+
+            result = {
+                "batch_id": batch_id,
+                "payments": completed.rowcount if completed else 0,
+                "closed_loans": closed.rowcount if closed else 0,
+            }
+            logger.info(f"Settled ACH batch {batch_id}: {result['payments']} payments completed, {result['closed_loans']} loans closed")
+            return result
+        except Exception as e:
+            logger.error(f"Error settling ACH batch {batch_id}: {str(e)}")
+            return {"error": f"Error settling ACH batch {batch_id}: {str(e)}"}
+
+    def settle_ach_batches(self, as_of=None):
+        """Settle every sent batch whose return window (ACH_RETURN_WINDOW_DAYS after it was sent) has passed by as_of"""
+        as_of = as_of or datetime.now().date()
+        # Sent on or before as_of - ACH_RETURN_WINDOW_DAYS
+        sent_before = datetime.combine(as_of - timedelta(days=ACH_RETURN_WINDOW_DAYS - 1), datetime.min.time())
+        batches = self.db.fetch_all("""
+        SELECT id FROM ach_batches
+        WHERE status = 'processed' AND sent_at IS NOT NULL AND sent_at < %s
+        ORDER BY batch_date, id
+        """, (sent_before,))
+        return [self.settle_ach_batch(batch['id']) for batch in batches]
+    
     def process_failed_payments(self, failed_transactions):
+        """
+        Mark returned payments and their ACH transactions failed. The
+        (payment_id, reason) pairs are staged in a temporary table and applied
+        with joined statements in one transaction, whatever their number.
+        Payments that had already been completed are reversed in the ledger.
+        """
         try:
+            # A payment returned twice keeps its last reason
+            returns = {}
             for transaction in failed_transactions:
-                payment_id = transaction.get('payment_id')
-                failure_reason = transaction.get('failure_reason', 'Unknown failure')
+                if transaction.get('payment_id'):
+                    returns[transaction['payment_id']] = transaction.get('failure_reason', 'Unknown failure')
 
-                # Update payment status to failed
-                self.update_payment_status(payment_id, 'failed', failure_reason)
-                
-                # Update ACH transaction status
-                query = """
-                UPDATE ach_transactions 
-                SET status = 'failed', failure_reason = %s, processed_at = NOW()
-                WHERE payment_id = %s
-                """
-                self.db.execute_query(query, (failure_reason, payment_id))
+            with self.db.transaction() as txn:
+                # Temporary tables are per connection, and the transaction keeps its connection
+                self.db.execute_query("""
+                CREATE TEMPORARY TABLE IF NOT EXISTS ach_returns (
+                    payment_id INT NOT NULL PRIMARY KEY,
+                    reason VARCHAR(255) NULL
+                )
+                """)
+                self.db.execute_query("DELETE FROM ach_returns")
+                self.db.insert_many('ach_returns', ('payment_id', 'reason'), list(returns.items()))
+
+                # Lock the returned payments and move the counters from the status they really had
+                previous = self.db.fetch_all("""
+                SELECT p.loan_id, p.due_date, p.status, COUNT(*) AS payment_count, SUM(p.amount) AS amount_total
+                FROM payments p
+                JOIN ach_returns r ON r.payment_id = p.id
+                WHERE p.status <> 'failed'
+                GROUP BY p.loan_id, p.due_date, p.status
+                FOR UPDATE
+                """)
+                self.record_payment_transitions([
+                    (row['loan_id'], row['due_date'], row['status'], 'failed', row['amount_total'], row['payment_count'])
+                    for row in previous
+                ])
+
+                # Completed payments already reduced the balance: reverse them and reopen their loans
+                if any(row['status'] == 'completed' for row in previous):
+                    self.db.execute_query("""
+                    INSERT INTO loan_ledger (loan_id, payment_id, entry_type, amount)
+                    SELECT p.loan_id, p.id, 'reversal', p.amount
+                    FROM payments p
+                    JOIN ach_returns r ON r.payment_id = p.id
+                    WHERE p.status = 'completed'
+                    """)
+                    self.db.execute_query("""
+                    UPDATE loans
+                    SET status = 'active'
+                    WHERE status = 'closed' AND id IN (
+                        SELECT p.loan_id FROM payments p
+                        JOIN ach_returns r ON r.payment_id = p.id
+                        WHERE p.status = 'completed'
+                    )
+                    """)
+
+                self.db.execute_query(self._update_from_returns(
+                    'payments', 'id', "status = 'failed', failure_reason = r.reason, processed_at = NOW()"
+                ))
+                updated = self.db.execute_query(self._update_from_returns(
+                    'ach_transactions', 'payment_id', "status = 'failed', failure_reason = r.reason, processed_at = NOW()"
+                ))
+                self.db.execute_query(
+                    "DROP TABLE IF EXISTS ach_returns" if self.db.dialect == 'sqlite' else "DROP TEMPORARY TABLE IF EXISTS ach_returns"
+                )
+
+            if txn.failed:
+                return {"error": f"Error processing failed payments: {txn.error}"}
             
+            logger.info(f"Marked {len(returns)} returned payments and {updated.rowcount if updated else 0} ACH transactions failed")
             return {"message": f"Processed {len(failed_transactions)} failed transactions", "status": "success"}
         except Exception as e:
             logger.error(f"Error processing failed payments: {str(e)}")
             return {"error": f"Error processing failed payments: {str(e)}"} 
+
+    def _update_from_returns(self, table, payment_column, assignments):
+        # MySQL updates through a JOIN, SQLite with UPDATE ... FROM; the assigned columns must not exist in ach_returns
+        if self.db.dialect == 'sqlite':
+            return f"UPDATE {table} SET {assignments} FROM ach_returns r WHERE r.payment_id = {table}.{payment_column}"
+        return f"UPDATE {table} JOIN ach_returns r ON r.payment_id = {table}.{payment_column} SET {assignments}"
         
-    def get_payments_by_loan_ids(self, loan_ids):
+    def get_payments_for_user(self, user_id, filters=None):
+        """
+        One page of the payments of a user's loans ordered by (due_date, id),
+        read with a single JOIN on loans.user_id. Supported filters: status,
+        limit, cursor (the next_cursor of the previous page), descending and
+        include_history. Returns the payments and the cursor of the next
+        page, or None on the last page.
+        """
         try:
-            # Convertir la lista de IDs a una cadena de texto con los IDs separados por comas
-            if isinstance(loan_ids, list):
-                loan_ids_str = ','.join(map(str, loan_ids))
-                query = f"""
-                SELECT * FROM payments WHERE loan_id IN ({loan_ids_str}) ORDER BY due_date ASC
+            filters = filters or {}
+            limit = filters.get('limit') or PAYMENTS_PAGE_DEFAULT_LIMIT
+            descending = filters.get('descending', False)
+
+            conditions = ["l.user_id = %s"]
+            params = [user_id]
+            if filters.get('status'):
+                conditions.append("p.status = %s")
+                params.append(filters['status'])
+            if filters.get('cursor'):
+                # Keyset: rows strictly after the last one of the previous page
+                after_date, after_id = decode_payment_cursor(filters['cursor'])
+                operator = '<' if descending else '>'
+                conditions.append(f"(p.due_date {operator} %s OR (p.due_date = %s AND p.id {operator} %s))")
+                params.extend([after_date, after_date, after_id])
+            where = ' AND '.join(conditions)
+            columns = ', '.join(f"p.{column}" for column in PAYMENT_COLUMNS.split(', '))
+            direction = "DESC" if descending else "ASC"
 
+            if filters.get('include_history'):
+                query = f"""
+                SELECT * FROM (
+                    SELECT {columns} FROM payments p JOIN loans l ON l.id = p.loan_id WHERE {where}
+                    UNION ALL
+                    SELECT {columns} FROM payments_history p JOIN loans l ON l.id = p.loan_id WHERE {where}
+                ) all_payments
+                ORDER BY due_date {direction}, id {direction}
+                LIMIT %s
                 """
-                payments = self.db.fetch_all(query, ())
+                params = params + params
             else:
-                # Si solo es un ID, usar la consulta original
-                query = """
-                SELECT * FROM payments WHERE loan_id = %s ORDER BY due_date ASC
+                query = f"""
+                SELECT {columns}
+                FROM payments p
+                JOIN loans l ON l.id = p.loan_id
+                WHERE {where}
+                ORDER BY p.due_date {direction}, p.id {direction}
+                LIMIT %s
                 """
-                payments = self.db.fetch_all(query, (loan_ids))
-            return self._convert_decimal_to_float(payments)
+            # One extra row tells whether there is a next page
+            params.append(limit + 1)
+            payments = self.db.fetch_all(query, tuple(params), prepared=True)
+
+            next_cursor = None
+            if len(payments) > limit:
+                payments = payments[:limit]
+                next_cursor = encode_payment_cursor(payments[-1])
+            return {"payments": self._convert_decimal_to_float(payments), "next_cursor": next_cursor}
         except Exception as e:
-            logger.error(f"Error getting payments by loan IDs: {str(e)}")
-            return []
+            logger.error(f"Error getting payments for user {user_id}: {str(e)}")
+            return {"error": f"Error getting payments: {str(e)}"}
+
+    def archive_settled_payments(self, chunk_size=None, max_chunks=None):
+        """
+        Move completed and failed payments of loans closed more than
+        PAYMENT_ARCHIVE_AFTER_DAYS ago, with their ACH transactions, into the
+        history tables. Each chunk of at most chunk_size payments is copied
+        and deleted in its own transaction, so locks stay short.
+        """
+        chunk_size = chunk_size or DB_BULK_CHUNK_SIZE
+        closed_before = datetime.now() - timedelta(days=PAYMENT_ARCHIVE_AFTER_DAYS)
+        result = {"payments": 0, "ach_transactions": 0, "chunks": 0}
+        try:
+            while max_chunks is None or result["chunks"] < max_chunks:
+                with self.db.transaction() as txn:
+                    rows = self.db.fetch_all("""
+                    SELECT p.id
+                    FROM payments p
+                    JOIN loans l ON l.id = p.loan_id
+                    WHERE l.status = 'closed' AND l.updated_at < %s
+                      AND p.status IN ('completed', 'failed')
+                    ORDER BY p.id
+                    LIMIT %s
+                    FOR UPDATE
+                    """, (closed_before, chunk_size))
+                    if not rows:
+                        break
+
+                    payment_ids = tuple(row['id'] for row in rows)
+                    placeholders = ', '.join(['%s'] * len(payment_ids))
+                    self.db.execute_query(f"""
+                    INSERT INTO payments_history ({PAYMENT_COLUMNS})
+                    SELECT {PAYMENT_COLUMNS} FROM payments WHERE id IN ({placeholders})
+                    """, payment_ids)
+                    copied = self.db.execute_query(f"""
+                    INSERT INTO ach_transactions_history ({ACH_TRANSACTION_COLUMNS})
+                    SELECT {ACH_TRANSACTION_COLUMNS} FROM ach_transactions WHERE payment_id IN ({placeholders})
+                    """, payment_ids)
+                    self.db.execute_query(f"DELETE FROM ach_transactions WHERE payment_id IN ({placeholders})", payment_ids)
+                    self.db.execute_query(f"DELETE FROM payments WHERE id IN ({placeholders})", payment_ids)
+
+                if txn.failed:
+                    result["error"] = f"Error archiving payments: {txn.error}"
+                    break
+                result["payments"] += len(payment_ids)
+                result["ach_transactions"] += copied.rowcount if copied else 0
+                result["chunks"] += 1
+                if len(payment_ids) < chunk_size:
+                    break
+
+            logger.info(f"Archived {result['payments']} payments and {result['ach_transactions']} ACH transactions in {result['chunks']} chunks")
+            return result
+        except Exception as e:
+            logger.error(f"Error archiving settled payments: {str(e)}")
+            result["error"] = f"Error archiving settled payments: {str(e)}"
+            return result
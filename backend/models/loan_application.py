@@ -1,4 +1,4 @@
-from config.db import Database
+from config.db import Database, read_your_writes
 import logging
 import json
 from datetime import datetime
@@ -9,36 +9,18 @@ from decimal import Decimal
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Columns of the application listings, so the plain and the filtered listing return the same rows
+APPLICATION_LIST_COLUMNS = (
+    "id, user_id, status, business_name, tax_id, industry, business_years, annual_revenue, "
+    "loan_amount, loan_purpose, loan_term, loan_total_amount, loan_monthly_payment, loan_interest_rate, "
+    "created_at, updated_at, submitted_at"
+)
+
 class LoanApplication:
     def __init__(self):
         self.db = Database()
-        self.create_tables()
         
-    def create_tables(self):
-        # Create loan_applications table if it doesn't exist
-        query = """
-        CREATE TABLE IF NOT EXISTS loan_applications (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT NOT NULL,
-            status ENUM('draft', 'submitted', 'reviewing', 'approved', 'declined', 'undecided') DEFAULT 'draft',
-            business_name VARCHAR(255),
-            tax_id VARCHAR(50),
-            business_info JSON,
-            financial_info JSON,
-            loan_amount DECIMAL(10, 2) NULL,
-            loan_purpose VARCHAR(255) NULL,
-            loan_term INT NULL,
-            loan_interest_rate DECIMAL(5, 4) NULL,
-            loan_total_amount DECIMAL(12, 2) NULL,
-            loan_monthly_payment DECIMAL(12, 2) NULL,
-            submitted_at TIMESTAMP NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-        """
-        self.db.execute_query(query)
-    
+    @read_your_writes()
     def create_application(self, data):
         try:
             # Extract basic data
@@ -63,8 +45,8 @@ class LoanApplication:
     
     def get_applications_by_user(self, user_id):
         try:
-            query = """
-            SELECT id, user_id, status, business_name, tax_id, loan_amount, loan_purpose, loan_term, loan_total_amount, loan_monthly_payment, loan_interest_rate, created_at, updated_at, submitted_at
+            query = f"""
+            SELECT {APPLICATION_LIST_COLUMNS}
             FROM loan_applications 
             WHERE user_id = %s
             ORDER BY created_at DESC
@@ -116,6 +98,7 @@ class LoanApplication:
             logger.error(f"Error getting application {application_id}: {str(e)}")
             return None
     
+    @read_your_writes()
     def update_business_info(self, application_id, data):
         try:
             # Format as JSON for storage
@@ -137,6 +120,7 @@ class LoanApplication:
             logger.error(f"Error updating business info for application {application_id}: {str(e)}")
             return {"error": f"Error updating business information: {str(e)}"}
     
+    @read_your_writes()
     def update_financial_info(self, application_id, data):
         try:
             # Format as JSON for storage
@@ -157,6 +141,7 @@ class LoanApplication:
             logger.error(f"Error updating financial info for application {application_id}: {str(e)}")
             return {"error": f"Error updating financial information: {str(e)}"}
     
+    @read_your_writes()
     def update_loan_details(self, application_id, data):
         try:
             # Update loan details columns
@@ -176,16 +161,24 @@ class LoanApplication:
     
     def validate_application_completeness(self, application_id):
         try:
-            application = self.get_application_by_id(application_id)
+            # Checked in SQL against the generated columns, without loading the JSON blobs
+            query = """
+            SELECT business_info IS NOT NULL AS has_business_info,
+                   financial_info IS NOT NULL AS has_financial_info,
+                   loan_amount, loan_purpose, business_name, annual_revenue
+            FROM loan_applications
+            WHERE id = %s
+            """
+            application = self.db.fetch_one(query, (application_id,))
             
             if not application:
                 return {"error": "Application not found"}
                 
             # Check if required sections are completed
-            if not application.get('business_info'):
+            if not application['has_business_info']:
                 return {"error": "Business information is required"}
                 
-            if not application.get('financial_info'):
+            if not application['has_financial_info']:
                 return {"error": "Financial information is required"}
                 
             if not application.get('loan_amount'):
@@ -194,14 +187,12 @@ class LoanApplication:
             if not application.get('loan_purpose'):
                 return {"error": "Loan purpose is required"}
             
-            # Validate required fields in business_info
-            business_info = application.get('business_info', {})
-            if not business_info.get('business_name'):
+            # business_name is written together with business_info by update_business_info
+            if not application.get('business_name'):
                 return {"error": "Business name is required"}
                 
-            # Validate required fields in financial_info
-            financial_info = application.get('financial_info', {})
-            if 'annual_revenue' not in financial_info:
+            # annual_revenue is generated from financial_info and NULL when missing or not a number
+            if application.get('annual_revenue') is None:
                 return {"error": "Annual revenue is required"}
             
             return {"valid": True}
@@ -209,6 +200,45 @@ class LoanApplication:
             logger.error(f"Error validating application {application_id}: {str(e)}")
             return {"error": f"Error validating application: {str(e)}"}
     
+    def search_applications(self, filters=None, limit=100):
+        """
+        Filter applications on the underwriting columns generated from the
+        JSON blobs. Supported filters: user_id, status, industry, business_name,
+        min_business_years, min_annual_revenue, max_annual_revenue.
+        """
+        try:
+            filters = filters or {}
+            conditions = []
+            params = []
+            for key, condition in (
+                ('user_id', "user_id = %s"),
+                ('status', "status = %s"),
+                ('industry', "industry = %s"),
+                ('business_name', "business_name = %s"),
+                ('min_business_years', "business_years >= %s"),
+                ('min_annual_revenue', "annual_revenue >= %s"),
+                ('max_annual_revenue', "annual_revenue <= %s"),
+            ):
+                if filters.get(key) is not None:
+                    conditions.append(condition)
+                    params.append(filters[key])
+            
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            query = f"""
+            SELECT {APPLICATION_LIST_COLUMNS}
+            FROM loan_applications
+            {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+            """
+            params.append(limit)
+            applications = self.db.fetch_all(query, tuple(params))
+            return self._convert_decimal_to_float(applications)
+        except Exception as e:
+            logger.error(f"Error searching applications: {str(e)}")
+            return []
+    
+    @read_your_writes()
     def submit_application(self, application_id):
         try:
             # Update status to submitted and set submitted_at timestamp
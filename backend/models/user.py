@@ -1,5 +1,5 @@
 import bcrypt
-from config.db import Database
+from config.db import Database, read_your_writes
 import logging
 
 # Set up logging
@@ -10,46 +10,14 @@ class User:
     def __init__(self):
         self.db = Database()
         
-    def create_tables(self):
-        # Create users table if it doesn't exist
-        query = """
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            email VARCHAR(255) NOT NULL UNIQUE,
-            password VARCHAR(255) NOT NULL,
-            first_name VARCHAR(100),
-            last_name VARCHAR(100),
-            role ENUM('admin', 'user') DEFAULT 'user',
-            language VARCHAR(10) DEFAULT 'es',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-        """
-        self.db.execute_query(query)
-        
-        # Create business_owners table if it doesn't exist
-        query = """
-        CREATE TABLE IF NOT EXISTS business_owners (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT NOT NULL,
-            business_name VARCHAR(255) NOT NULL,
-            business_address VARCHAR(255),
-            phone_number VARCHAR(20),
-            tax_id VARCHAR(50),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-        """
-        self.db.execute_query(query)
-        
+    @read_your_writes()
     def create_user(self, email, password, first_name=None, last_name=None, role='user', language='en'):
         try:
             # Normalize email
             normalized_email = email.strip().lower()
             
-            # Check if user already exists
-            query = "SELECT id FROM users WHERE LOWER(email) = LOWER(%s)"
+            # Check if user already exists (emails are stored normalized, so this uses the UNIQUE index)
+            query = "SELECT id FROM users WHERE email = %s"
             existing_user = self.db.fetch_one(query, (normalized_email,))
             
             if existing_user:
@@ -104,7 +72,7 @@ class User:
             logger.info(f"Trying to verify user with email: '{normalized_email}'")
             
             # Find user by normalized email
-            query = "SELECT id, email, password, first_name, last_name, role, language FROM users WHERE LOWER(email) = LOWER(%s)"
+            query = "SELECT id, email, password, first_name, last_name, role, language FROM users WHERE email = %s"
             user = self.db.fetch_one(query, (normalized_email,))
             
             if not user:
@@ -157,6 +125,7 @@ class User:
             logger.error(f"Error in get_user_by_id: {str(e)}")
             return None
     
+    @read_your_writes()
     def update_user(self, user_id, data):
         try:
             query = """
@@ -170,6 +139,7 @@ class User:
             logger.error(f"Error in update_user: {str(e)}")
             return {"error": f"Error updating user: {str(e)}"}
 
+    @read_your_writes()
     def update_language(self, user_id, language):
         try:
             query = """
@@ -183,6 +153,19 @@ class User:
             logger.error(f"Error in update_language: {str(e)}")
             return {"error": f"Error updating language: {str(e)}"}
     
+    def get_role(self, user_id):
+        try:
+            query = """
+            SELECT role
+            FROM users
+            WHERE id = %s
+            """
+            result = self.db.fetch_one(query, (user_id,))
+            return result['role'] if result else None
+        except Exception as e:
+            logger.error(f"Error in get_role: {str(e)}")
+            return None
+    
     def get_language(self, user_id):
         try:
             query = """
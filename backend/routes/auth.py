@@ -12,11 +12,6 @@ logger = logging.getLogger(__name__)
 auth_bp = Blueprint('auth', __name__)
 user_model = User()
 
-# Create necessary tables on startup
-@auth_bp.before_app_first_request
-def setup_db():
-    user_model.create_tables()
-
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """
@@ -112,7 +107,8 @@ def register():
             password=data.get('password'),
             first_name=data.get('first_name'),
             last_name=data.get('last_name'),
-            role=data.get('role', 'user')
+            # Self-registration never grants admin; admins are promoted in the database
+            role='user'
         )
         
         if "error" in user_data:
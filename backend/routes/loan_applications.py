@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import get_jwt_identity, jwt_required
 import logging
 from models.loan_application import LoanApplication
+from models.user import User
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -9,6 +10,17 @@ logger = logging.getLogger(__name__)
 
 loan_app_bp = Blueprint('loan_applications', __name__)
 loan_app_model = LoanApplication()
+user_model = User()
+
+# Query parameters of GET /loan-applications that filter on the underwriting columns, with their types
+SEARCH_FILTERS = {
+    'status': str,
+    'industry': str,
+    'business_name': str,
+    'min_business_years': int,
+    'min_annual_revenue': float,
+    'max_annual_revenue': float,
+}
 
 @loan_app_bp.route('', methods=['POST'])
 @jwt_required()
@@ -129,13 +141,45 @@ def get_user_loan_applications():
     """
     Get all loan applications for the authenticated user
     ---
+    description: With any of the filter parameters the applications are searched on the indexed underwriting columns; admins search every user's applications, other users only their own.
     tags:
       - Loan Applications
+    parameters:
+      - name: status
+        in: query
+        required: false
+        type: string
+      - name: industry
+        in: query
+        required: false
+        type: string
+      - name: business_name
+        in: query
+        required: false
+        type: string
+      - name: min_business_years
+        in: query
+        required: false
+        type: integer
+      - name: min_annual_revenue
+        in: query
+        required: false
+        type: number
+      - name: max_annual_revenue
+        in: query
+        required: false
+        type: number
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        description: Maximum number of results of a search (at most 500)
+        default: 100
     security:
       - Bearer: []
     responses:
       200:
-        description: List of loan applications
+        description: List of loan applications, with the same fields with and without filters
         schema:
           type: object
           properties:
@@ -186,8 +230,26 @@ def get_user_loan_applications():
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
         
-        # Get all applications for the user
-        applications = loan_app_model.get_applications_by_user(user_id)
+        filters = {}
+        try:
+            for key, cast in SEARCH_FILTERS.items():
+                if request.args.get(key):
+                    filters[key] = cast(request.args[key])
+            limit = max(1, min(int(request.args.get('limit', 100)), 500))
+        except ValueError:
+            return jsonify({
+                "error": "Invalid filter",
+                "message": "min_business_years and limit must be integers, revenue filters numbers"
+            }), 400
+        
+        if filters:
+            # Search on the generated columns; only admins see other users' applications
+            if user_model.get_role(user_id) != 'admin':
+                filters['user_id'] = user_id
+            applications = loan_app_model.search_applications(filters, limit=limit)
+        else:
+            # Get all applications for the user
+            applications = loan_app_model.get_applications_by_user(user_id)
         
         return jsonify({
             "applications": applications
@@ -70,7 +70,7 @@ def get_loan(loan_id):
       - Bearer: []
     responses:
       200:
-        description: Loan details
+        description: Loan details with a payment summary (counts and amounts per status)
       401:
         description: Unauthorized
       404:
@@ -98,36 +98,18 @@ def get_loan(loan_id):
                 "message": "You do not have permission to access this loan"
             }), 401
         
-        # Get payments for this loan
-        payments = loan_model.get_loan_payments(loan_id)
-        
-        # Group payments by status
-        payment_summary = {
-            "completed": [],
-            "scheduled": [],
-            "processing": [],
-            "failed": []
-        }
-        
-        for payment in payments:
-            status = payment['status']
-            if status in payment_summary:
-                payment_summary[status].append(payment)
+        # Payment counts come from the per-loan counters; the rows are at /payments/loan/<loan_id>
+        summary = loan_model.get_payment_summary(loan_id)
+        if summary is None:
+            return jsonify({
+                "error": "Failed to retrieve loan details",
+                "message": "Could not load the payment summary"
+            }), 500
         
         return jsonify({
             "loan": loan,
             "payments": {
-                "summary": {
-                    "total": len(payments),
-                    "completed": len(payment_summary['completed']),
-                    "scheduled": len(payment_summary['scheduled']),
-                    "processing": len(payment_summary['processing']),
-                    "failed": len(payment_summary['failed'])
-                },
-                "completed": payment_summary['completed'],
-                "scheduled": payment_summary['scheduled'],
-                "processing": payment_summary['processing'],
-                "failed": payment_summary['failed']
+                "summary": summary
             },
             "status": "success"
         }), 200
@@ -0,0 +1,183 @@
+from flask import Blueprint, Response, jsonify, request
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from functools import wraps
+import hmac
+import logging
+import os
+from config.db import all_pool_stats
+from config.query_stats import registry as query_stats, slow_query_log
+from models.user import User
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+metrics_bp = Blueprint('metrics', __name__)
+user_model = User()
+
+# Shared secret the scraper sends as "Authorization: Bearer <token>"; without it only admins can read metrics
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+
+def metrics_access_required(view):
+    """Allow the scrape token or the JWT of an admin; metrics expose SQL and call sites"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        auth_header = request.headers.get('Authorization', '')
+        if METRICS_TOKEN and hmac.compare_digest(auth_header.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            return view(*args, **kwargs)
+        try:
+            verify_jwt_in_request()
+        except Exception as e:
+            logger.warning(f"Rejected metrics request: {str(e)}")
+            return jsonify({"error": "Unauthorized", "message": "Metrics require the scrape token or an admin token"}), 401
+        if user_model.get_role(get_jwt_identity()) != 'admin':
+            return jsonify({"error": "Forbidden", "message": "Metrics are only available to admins"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@metrics_bp.route('', methods=['GET'])
+@metrics_access_required
+def get_metrics():
+    """
+    Query and connection pool metrics in Prometheus text format
+    ---
+    tags:
+      - Metrics
+    security:
+      - Bearer: []
+    responses:
+      401:
+        description: Missing scrape token or JWT
+      403:
+        description: Not an admin
+      200:
+        description: Per-fingerprint latency histograms, row and error counters, and pool gauges
+    """
+    lines = [query_stats.to_prometheus()]
+    lines.append("# HELP db_pool_connections Connection pool state")
+    lines.append("# TYPE db_pool_connections gauge")
+    for pool_name, stats in all_pool_stats().items():
+        for key in ('size', 'open', 'idle', 'checked_out'):
+            lines.append(f'db_pool_connections{{pool="{pool_name}",state="{key}"}} {stats[key]}')
+    lines.append("# HELP db_pool_events_total Connection pool events")
+    lines.append("# TYPE db_pool_events_total counter")
+    for pool_name, stats in all_pool_stats().items():
+        for key in ('connections_created', 'connections_closed', 'checkouts', 'waits', 'timeouts', 'recycled', 'ping_failures', 'statements_prepared', 'statement_cache_hits'):
+            lines.append(f'db_pool_events_total{{pool="{pool_name}",event="{key}"}} {stats[key]}')
+
+    return Response("\n".join(lines) + "\n", mimetype='text/plain; version=0.0.4')
+
+
+@metrics_bp.route('/queries', methods=['GET'])
+@metrics_access_required
+def get_query_metrics():
+    """
+    Per-query statistics as JSON
+    ---
+    tags:
+      - Metrics
+    parameters:
+      - name: sort
+        in: query
+        required: false
+        type: string
+        description: Field to sort by, highest first
+        enum: [total_ms, p99_ms, p95_ms, mean_ms, max_ms, calls, rows, errors]
+        default: total_ms
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        description: Maximum number of fingerprints to return
+    security:
+      - Bearer: []
+    responses:
+      401:
+        description: Missing scrape token or JWT
+      403:
+        description: Not an admin
+      200:
+        description: Query statistics
+        schema:
+          type: object
+          properties:
+            queries:
+              type: array
+              items:
+                type: object
+                properties:
+                  fingerprint:
+                    type: string
+                    example: "SELECT * FROM loans WHERE id = ?"
+                  calls:
+                    type: integer
+                  p99_ms:
+                    type: number
+            pools:
+              type: object
+    """
+    sort_by = request.args.get('sort', 'total_ms')
+    if sort_by not in ('total_ms', 'p99_ms', 'p95_ms', 'mean_ms', 'max_ms', 'calls', 'rows', 'errors'):
+        return jsonify({
+            "error": "Invalid sort field",
+            "message": f"Cannot sort by {sort_by}"
+        }), 400
+
+    limit = request.args.get('limit', type=int)
+    return jsonify({
+        "queries": query_stats.snapshot(sort_by=sort_by, limit=limit),
+        "pools": all_pool_stats(),
+        "status": "success"
+    }), 200
+
+
+@metrics_bp.route('/slow-queries', methods=['GET'])
+@metrics_access_required
+def get_slow_queries():
+    """
+    Statements that exceeded DB_SLOW_QUERY_MS, one entry per fingerprint
+    ---
+    tags:
+      - Metrics
+    security:
+      - Bearer: []
+    responses:
+      401:
+        description: Missing scrape token or JWT
+      403:
+        description: Not an admin
+      200:
+        description: Slow query entries with their EXPLAIN plan and call site
+        schema:
+          type: object
+          properties:
+            threshold_ms:
+              type: number
+              example: 500
+            slow_queries:
+              type: array
+              items:
+                type: object
+                properties:
+                  fingerprint:
+                    type: string
+                  elapsed_ms:
+                    type: number
+                  call_site:
+                    type: string
+                    example: "models/loan.py:412 in get_payments_by_loan_ids"
+                  estimated_rows_examined:
+                    type: integer
+                  plan:
+                    type: array
+                    items:
+                      type: object
+    """
+    entries = sorted(slow_query_log.entries(), key=lambda entry: entry['elapsed_ms'], reverse=True)
+    return jsonify({
+        "threshold_ms": slow_query_log.threshold_ms,
+        "slow_queries": entries,
+        "status": "success"
+    }), 200
@@ -1,8 +1,9 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.loan import Loan
+from models.user import User
+from models.loan import Loan, PAYMENTS_PAGE_DEFAULT_LIMIT, PAYMENTS_PAGE_MAX_LIMIT, PAYMENT_STATUSES, decode_payment_cursor
 import logging
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import json
 from tasks.ach_processor import generate_daily_ach_file, process_ach_return_file
 
@@ -15,13 +16,14 @@ payment_bp = Blueprint('payments', __name__)
 
 # Initialize models
 loan_model = Loan()
+user_model = User()
 
 
 @payment_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_payments():
     """
-    Get all pending payments
+    Get the payments of the user's loans, one page at a time
     ---
     parameters:
       - name: status
@@ -34,14 +36,26 @@ def get_payments():
         in: query
         required: false
         type: integer
-        description: Number of payments to return (optional)
-        default: 10
+        description: Number of payments to return (optional, at most 500)
+        default: 100
       - name: sort
         in: query
         required: false
         type: string
-        description: Sort order (optional)
-        default: created_at:asc
+        description: Sort order (optional); payments with the same due date are ordered by id. created_at:asc and created_at:desc are accepted as aliases of due_date:asc and due_date:desc
+        enum: [due_date:asc, due_date:desc, created_at:asc, created_at:desc]
+        default: due_date:asc
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: next_cursor of the previous page (optional)
+      - name: include_history
+        in: query
+        required: false
+        type: boolean
+        description: Also return archived payments of closed loans (optional)
+        default: false
         
     tags:
       - Payments
@@ -49,7 +63,9 @@ def get_payments():
       - Bearer: []
     responses:
       200:
-        description: List of payments for the loan
+        description: A page of payments, the cursor of the next page (null on the last page) and the total number of payments matching status across all pages, archived payments included
+      400:
+        description: Invalid filter, limit, sort or cursor
       401:
         description: Unauthorized
       404:
@@ -60,14 +76,65 @@ def get_payments():
     try:
         # Get user ID from JWT token
         user_id = get_jwt_identity()
-        # Get loan to verify ownership
-        loans = loan_model.get_loan_by_user_id(user_id)
-        loan_ids = [loan['id'] for loan in loans]
 
-        payments = loan_model.get_payments_by_loan_ids(loan_ids)        
+        status = request.args.get('status')
+        if status == 'all':
+            status = None
+        if status and status not in PAYMENT_STATUSES:
+            return jsonify({
+                "error": "Invalid status",
+                "message": f"Status must be one of: {', '.join(PAYMENT_STATUSES)}, all"
+            }), 400
+
+        try:
+            limit = int(request.args.get('limit', PAYMENTS_PAGE_DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return jsonify({
+                "error": "Invalid limit",
+                "message": "limit must be a positive integer"
+            }), 400
+        limit = min(limit, PAYMENTS_PAGE_MAX_LIMIT)
+
+        sort = request.args.get('sort', 'due_date:asc')
+        # created_at was the documented sort before pagination; payments are created in due date order
+        sort = {'created_at:asc': 'due_date:asc', 'created_at:desc': 'due_date:desc'}.get(sort, sort)
+        if sort not in ('due_date:asc', 'due_date:desc'):
+            return jsonify({
+                "error": "Invalid sort",
+                "message": "sort must be due_date:asc or due_date:desc"
+            }), 400
+
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                decode_payment_cursor(cursor)
+            except ValueError:
+                return jsonify({
+                    "error": "Invalid cursor",
+                    "message": "cursor must be the next_cursor of a previous page"
+                }), 400
+
+        # Only payments of the user's own loans, joined in the same query
+        page = loan_model.get_payments_for_user(user_id, {
+            "status": status,
+            "limit": limit,
+            "cursor": cursor,
+            "descending": sort == 'due_date:desc',
+            "include_history": request.args.get('include_history', 'false').lower() == 'true',
+        })
+        if 'error' in page:
+            return jsonify({
+                "error": "Failed to retrieve payments",
+                "message": page['error']
+            }), 500
         
         return jsonify({
-            "payments": payments,
+            "payments": page['payments'],
+            "next_cursor": page['next_cursor'],
+            # Across all pages, read from the per-loan counters
+            "total": loan_model.count_payments_for_user(user_id, status),
             "status": "success"
         }), 200
     except Exception as e:
@@ -77,6 +144,72 @@ def get_payments():
             "message": str(e)
         }), 500
 
+@payment_bp.route('/collections', methods=['GET'])
+@jwt_required()
+def get_daily_collections():
+    """
+    Daily collection totals by payment status. Admins get the platform-wide
+    daily_collections rollup; other users get the totals of their own loans
+    ---
+    tags:
+      - Payments
+    parameters:
+      - name: from
+        in: query
+        required: false
+        type: string
+        format: date
+        description: First due date (defaults to 30 days ago)
+      - name: to
+        in: query
+        required: false
+        type: string
+        format: date
+        description: Last due date (defaults to today)
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: One entry per day with count and amount per status
+        schema:
+          type: object
+          properties:
+            collections:
+              type: array
+              items:
+                type: object
+                example: {"date": "2024-06-01", "completed": {"count": 120, "amount": 4400.0}}
+      400:
+        description: Invalid date
+      500:
+        description: Server error
+    """
+    try:
+        try:
+            end_date = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else date.today()
+            start_date = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else end_date - timedelta(days=30)
+        except ValueError:
+            return jsonify({
+                "error": "Invalid date format",
+                "message": "Dates must be in format YYYY-MM-DD"
+            }), 400
+        
+        # Platform-wide totals cover every merchant, so only admins see them
+        user_id = get_jwt_identity()
+        scope_user_id = None if user_model.get_role(user_id) == 'admin' else user_id
+        collections = loan_model.get_daily_collections(start_date, end_date, user_id=scope_user_id)
+        
+        return jsonify({
+            "collections": collections,
+            "status": "success"
+        }), 200
+    except Exception as e:
+        logger.error(f"Error getting daily collections: {str(e)}")
+        return jsonify({
+            "error": "Failed to retrieve daily collections",
+            "message": str(e)
+        }), 500
+
 @payment_bp.route('/loan/<int:loan_id>', methods=['GET'])
 @jwt_required()
 def get_loan_payments(loan_id):
@@ -91,6 +224,12 @@ def get_loan_payments(loan_id):
         required: true
         type: integer
         description: ID of the loan to retrieve payments for
+      - name: include_history
+        in: query
+        required: false
+        type: boolean
+        description: Also return archived payments (optional)
+        default: false
     security:
       - Bearer: []
     responses:
@@ -124,7 +263,8 @@ def get_loan_payments(loan_id):
             }), 401
         
         # Get payments for this loan
-        payments = loan_model.get_loan_payments(loan_id)
+        include_history = request.args.get('include_history', 'false').lower() == 'true'
+        payments = loan_model.get_loan_payments(loan_id, include_history=include_history)
         
         return jsonify({
             "payments": payments,
@@ -425,6 +565,55 @@ def process_failed_payments():
             "message": str(e)
         }), 500
 
+@payment_bp.route('/ach-batches/<int:batch_id>/sent', methods=['POST'])
+@jwt_required()
+def mark_ach_batch_sent(batch_id):
+    """
+    Record that the file of an ACH batch was delivered to the bank by hand
+    ---
+    description: Batches uploaded by the daily task are marked automatically. Only sent batches are settled once the return window has passed.
+    tags:
+      - Payments
+    parameters:
+      - name: batch_id
+        in: path
+        required: true
+        type: integer
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: Batch marked as sent
+      400:
+        description: Batch not found, without a generated file, or already sent
+      403:
+        description: Not an admin
+    """
+    try:
+        if user_model.get_role(get_jwt_identity()) != 'admin':
+            return jsonify({
+                "error": "Forbidden",
+                "message": "Only admins can mark ACH batches as sent"
+            }), 403
+        
+        batch = loan_model.mark_ach_batch_sent(batch_id)
+        if 'error' in batch:
+            return jsonify({
+                "error": "Failed to mark ACH batch as sent",
+                "message": batch['error']
+            }), 400
+        
+        return jsonify({
+            "batch": batch,
+            "status": "success"
+        }), 200
+    except Exception as e:
+        logger.error(f"Error marking ACH batch {batch_id} as sent: {str(e)}")
+        return jsonify({
+            "error": "Failed to mark ACH batch as sent",
+            "message": str(e)
+        }), 500
+
 @payment_bp.route('/generate-ach-file', methods=['POST'])
 def generate_ach_file():
     """
@@ -17,6 +17,7 @@ import tempfile # Añadido para archivos temporales
 
 from models.loan import Loan
 from config.celery_config import celery_app
+from config.db import read_your_writes
 from dotenv import load_dotenv
 
 # Configuración de registro
@@ -256,6 +257,7 @@ def upload_file_to_sftp(local_file_path, remote_file_name):
         return {'error': f'SFTP: Unexpected error during upload: {str(e)}'}
 
 @celery_app.task
+@read_your_writes()  # El batch recién creado se lee del primario, no de una réplica con retraso
 def generate_daily_ach_file():
     """
     Tarea que genera un archivo ACH diario usando la implementación manual y lo sube a SFTP.
@@ -311,9 +313,11 @@ def generate_daily_ach_file():
             # La ruta base del directorio remoto se toma de SFTP_REMOTE_PATH dentro de la función.
             sftp_upload_result = upload_file_to_sftp(file_path, file_name) 
             if sftp_upload_result and 'error' in sftp_upload_result:
+                # El batch queda sin sent_at y no se liquida hasta marcarlo como enviado
                 logger.error(f"SFTP: Falló la subida del archivo {file_name}: {sftp_upload_result['error']}")
             elif sftp_upload_result and 'message' in sftp_upload_result:
                  logger.info(f"SFTP: {sftp_upload_result['message']} ({sftp_upload_result.get('sftp_path')})")
+                 loan_model.mark_ach_batch_sent(batch_id_db)
         else:
             logger.error(f"SFTP: El archivo local {file_path} no existe, no se puede subir.")
             sftp_upload_result = {'error': f'Local file {file_path} not found for SFTP upload'}
@@ -341,14 +345,9 @@ def create_nacha_file_manually(db_batch_id, processing_date_obj, nacha_batch_num
     nacha_batch_number_str es el número de lote de 7 dígitos para el archivo.
     """
     try:
+        # Las transacciones se consumen a medida que llegan; un batch sin transacciones
+        # termina sin entradas y se reporta más abajo.
         ach_transactions_db = get_ach_transactions(db_batch_id)
-        if not ach_transactions_db:
-            logger.info(f"Manual: No se encontraron transacciones ACH para el batch de DB {db_batch_id}")
-            # Devuelve un error o un mensaje indicando que no se generará un archivo porque no hay transacciones.
-            # Un archivo ACH no puede estar vacío, pero un archivo con 0 transacciones sí se puede generar (solo headers/controls).
-            # Sin embargo, el flujo actual espera transacciones.
-            return {'message': f"No hay transacciones para el batch {db_batch_id}, no se generará archivo."}
-
 
         # --- File Header ---
         file_header_rec = ach_manual_create_file_header(
@@ -381,27 +380,32 @@ def create_nacha_file_manually(db_batch_id, processing_date_obj, nacha_batch_num
         entry_addenda_count_batch = 0 # Solo registros '6' y '7'. Para PPD sin addendas, solo '6'.
         
         entry_sequence_counter = 0 # Secuencial para los últimos 7 dígitos del Trace Number
+        skipped_transactions = [] # (id de transacción, motivo) de las entradas que no van al archivo
 
         for transaction in ach_transactions_db:
             entry_sequence_counter += 1 # Incrementa para cada entrada
             payment = get_payment_details(transaction['payment_id'])
             if not payment:
                 logger.warning(f"Manual: No se encontraron detalles de pago para payment_id {transaction['payment_id']}. Saltando transacción.")
+                skipped_transactions.append((transaction['id'], 'Payment not found'))
                 continue
                 
             loan_application_data = get_loan_application_data(payment['loan_id'])
             if not loan_application_data:
                 logger.warning(f"Manual: No info de app para préstamo {payment['loan_id']} (transacción DB ID {transaction['id']}). Saltando.")
+                skipped_transactions.append((transaction['id'], 'Loan application not found'))
                 continue
             
             bank_info = extract_bank_info(loan_application_data)
             if not bank_info or not bank_info.get('routing_number') or not bank_info.get('account_number') or not bank_info.get('account_holder_name'):
                 logger.warning(f"Manual: Info bancaria incompleta para préstamo {payment['loan_id']} (transacción DB ID {transaction['id']}). Saltando.")
+                skipped_transactions.append((transaction['id'], 'Incomplete bank information'))
                 continue
 
             routing_number_full_9digit = bank_info['routing_number'].strip()
             if len(routing_number_full_9digit) != 9 or not routing_number_full_9digit.isdigit():
                 logger.warning(f"Manual: Número de ruta inválido '{routing_number_full_9digit}' para préstamo {payment['loan_id']}. Saltando.")
+                skipped_transactions.append((transaction['id'], 'Invalid routing number'))
                 continue
             
             ach_transaction_code = TRANSACTION_CODE_CHECKING_DEBIT 
@@ -410,14 +414,14 @@ def create_nacha_file_manually(db_batch_id, processing_date_obj, nacha_batch_num
                 amount_in_cents = int(float(transaction['amount']) * 100)
             except ValueError:
                 logger.warning(f"Manual: Monto inválido '{transaction['amount']}' para préstamo {payment['loan_id']}. Saltando.")
+                skipped_transactions.append((transaction['id'], 'Invalid amount'))
                 continue
 
-            total_debit_amount_cents_batch += amount_in_cents
-            
             try: # Sumar los primeros 8 dígitos del número de ruta del RDFI
-                entry_hash_accumulator_batch += int(routing_number_full_9digit[:8])
+                entry_hash = int(routing_number_full_9digit[:8])
             except ValueError:
                  logger.error(f"Manual: Número de ruta {routing_number_full_9digit} no es numérico para cálculo de hash. Saltando transacción.")
+                 skipped_transactions.append((transaction['id'], 'Invalid routing number'))
                  continue # O manejar de otra forma, e.g., asignar 0 a este sumando.
 
             # Se asume que transaction['trace_number'] contiene el trace number de 15 caracteres
@@ -426,8 +430,13 @@ def create_nacha_file_manually(db_batch_id, processing_date_obj, nacha_batch_num
 
             if not trace_number_from_db or len(trace_number_from_db) != 15:
                 logger.error(f"Manual: Trace number inválido o ausente ('{trace_number_from_db}') para transacción ID {transaction.get('id')}. Saltando. Asegúrese de que ach_transactions.trace_number esté poblado con un valor de 15 caracteres.")
+                skipped_transactions.append((transaction['id'], 'Invalid trace number'))
                 continue
 
+            # Los totales solo suman las entradas que se escriben en el archivo
+            total_debit_amount_cents_batch += amount_in_cents
+            entry_hash_accumulator_batch += entry_hash
+
             entry_rec = ach_manual_create_entry_detail(
                 transaction_code_2digit=ach_transaction_code,
                 receiving_dfi_routing_9digit=routing_number_full_9digit,
@@ -441,6 +450,13 @@ def create_nacha_file_manually(db_batch_id, processing_date_obj, nacha_batch_num
             entry_detail_recs.append(entry_rec)
             entry_addenda_count_batch += 1 # Cada registro de entrada tipo '6' cuenta como 1
 
+        # Las entradas saltadas salen del batch (transacción fallida, pago de vuelta a 'scheduled'),
+        # así la liquidación del batch no completa débitos que nunca se enviaron al banco
+        if skipped_transactions:
+            released = loan_model.release_ach_transactions(db_batch_id, skipped_transactions)
+            if 'error' in released:
+                return {'error': released['error']}
+
         if not entry_detail_recs: # Si después de iterar no hay entradas válidas
             logger.info("Manual: No hay entradas válidas para añadir al batch después de procesar transacciones.")
             # Podríamos decidir generar un archivo "vacío" (solo con controles y headers), o retornar error.
@@ -501,21 +517,18 @@ def create_nacha_file_manually(db_batch_id, processing_date_obj, nacha_batch_num
 # --- Funciones de obtención de datos (sin cambios significativos en su lógica interna) ---
 def get_ach_transactions(batch_id):
     """
-    Obtiene todas las transacciones ACH para un batch específico
+    Itera sobre las transacciones ACH pendientes de un batch específico.
+    Las filas se leen en bloques desde la base de datos, así que un día de cobro
+    grande no se carga completo en memoria.
     """
-    try:
-        query = """
-        SELECT at.*, p.loan_id
-        FROM ach_transactions at
-        JOIN payments p ON at.payment_id = p.id
-        WHERE at.batch_id = %s AND at.status = 'pending'
-        """
-        transactions = loan_model.db.fetch_all(query, (batch_id,))
-        logger.info(f"Se encontraron {len(transactions)} transacciones para el batch {batch_id}")
-        return transactions
-    except Exception as e:
-        logger.error(f"Error al obtener transacciones ACH: {str(e)}")
-        return []
+    query = """
+    SELECT at.*, p.loan_id
+    FROM ach_transactions at
+    JOIN payments p ON at.payment_id = p.id
+    WHERE at.batch_id = %s AND at.status = 'pending'
+    """
+    logger.info(f"Leyendo transacciones para el batch {batch_id}")
+    return loan_model.db.iter_rows(query, (batch_id,))
 
 def get_payment_details(payment_id):
     """
@@ -733,6 +746,25 @@ def process_ach_return_file():
         logger.error(traceback.format_exc())
         return {'error': f'Error general en process_ach_return_file: {str(e)}', 'status': 'task_error'}
 
+@celery_app.task
+def settle_ach_batches():
+    """
+    Tarea que liquida los batches ACH enviados (con sent_at) cuya ventana de
+    retornos (ACH_RETURN_WINDOW_DAYS) ya pasó: los pagos no devueltos pasan a
+    completed, se registran en el ledger y se cierran los préstamos pagados.
+    """
+    try:
+        results = loan_model.settle_ach_batches()
+        errors = [result['error'] for result in results if 'error' in result]
+        for error in errors:
+            logger.error(f"Error al liquidar batch ACH: {error}")
+        settled = [result for result in results if 'error' not in result]
+        logger.info(f"Batches ACH liquidados: {len(settled)}, pagos completados: {sum(result['payments'] for result in settled)}")
+        return {'settled': settled, 'errors': errors}
+    except Exception as e:
+        logger.error(f"Error general en settle_ach_batches: {str(e)}")
+        return {'error': f'Error general en settle_ach_batches: {str(e)}'}
+
 # --- Funciones para Procesamiento de Archivos de Retorno ACH ---
 def download_return_file_from_sftp(target_date: date):
     """
@@ -816,7 +848,7 @@ def parse_nacha_return_file_content(file_content_string: str):
                 return_reason_code = line[3:6].strip()
                 logger.info(f"Parse Return: Encontrado Addenda de Retorno (99) para Trace {current_entry_detail_trace_number}. Código: {return_reason_code}")
                 query = "SELECT payment_id FROM ach_transactions WHERE trace_number = %s LIMIT 1"
-                db_result = loan_model.db.fetch_one(query, (current_entry_detail_trace_number,))
+                db_result = loan_model.db.fetch_one(query, (current_entry_detail_trace_number,), prepared=True)
                 if db_result and db_result.get('payment_id'):
                     payment_id = db_result['payment_id']
                     failed_transactions_for_processing.append({
@@ -0,0 +1,76 @@
+import logging
+from config.celery_config import celery_app
+from config.db import Database
+from models.loan import Loan
+from migrations.payments_partitioning import maintain_partitions
+from dotenv import load_dotenv
+
+# Configuración de registro
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cargar variables de entorno
+load_dotenv()
+
+db = Database()
+loan_model = Loan()
+
+
+@celery_app.task
+def maintain_payment_partitions():
+    """
+    Tarea que mantiene las particiones mensuales de payments: crea las de los
+    próximos meses y fusiona por año las antiguas. No hace nada si la tabla no
+    está particionada (ver migrate.py partition-payments) o en SQLite.
+    """
+    try:
+        summary = maintain_partitions(db)
+        if summary['added'] or summary['merged']:
+            logger.info(f"Particiones de payments creadas: {summary['added']}, fusionadas: {summary['merged']}")
+        return summary
+    except Exception as e:
+        logger.error(f"Error al mantener las particiones de payments: {str(e)}")
+        return {'error': str(e)}
+
+
+@celery_app.task
+def archive_settled_payments():
+    """
+    Tarea que mueve los pagos liquidados de préstamos cerrados (y sus
+    transacciones ACH) a las tablas de historial, por bloques.
+    """
+    result = loan_model.archive_settled_payments()
+    if 'error' in result:
+        logger.error(f"Error al archivar pagos: {result['error']}")
+    else:
+        logger.info(f"Pagos archivados: {result['payments']}, transacciones ACH: {result['ach_transactions']}")
+    return result
+
+
+@celery_app.task
+def extend_payment_schedules():
+    """
+    Tarea que escribe los pagos programados de los préstamos activos hasta
+    PAYMENT_SCHEDULE_WINDOW_DAYS días por delante. No hace nada si la ventana
+    es 0, porque entonces el calendario completo se crea al financiar.
+    """
+    result = loan_model.extend_payment_schedules()
+    if 'error' in result:
+        logger.error(f"Error al extender los calendarios de pago: {result['error']}")
+    else:
+        logger.info(f"Calendarios extendidos: {result['loans']} préstamos, {result['payments']} pagos")
+    return result
+
+
+@celery_app.task
+def snapshot_loan_balances():
+    """
+    Tarea que consolida los movimientos de loan_ledger en la foto de saldo de
+    cada préstamo, para que leer un saldo solo sume los movimientos recientes.
+    """
+    result = loan_model.snapshot_loan_balances()
+    if 'error' in result:
+        logger.error(f"Error al consolidar los saldos: {result['error']}")
+    else:
+        logger.info(f"Saldos consolidados: {result['loans']} préstamos")
+    return result
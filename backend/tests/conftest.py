@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The models read the backend configuration when they are imported, so the
+# tests point them at a throwaway SQLite file before importing anything
+os.environ['DB_BACKEND'] = 'sqlite'
+os.environ['DB_SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='loan_tracker_tests_'), 'tests.sqlite3')
+os.environ.setdefault('DB_REPLICA_HOSTS', '')
+os.environ.setdefault('DB_QUERY_BUDGET_MODE', 'off')
+os.environ.setdefault('JWT_SECRET_KEY', 'test-secret')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrate  # noqa: E402
+from config.db import Database  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def schema():
+    db = Database()
+    assert migrate.upgrade(db)
+    return db
+
+
+@pytest.fixture
+def db(schema):
+    """The migrated test database, emptied before each test"""
+    tables = schema.fetch_all(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT IN ('schema_migrations', 'sqlite_sequence')"
+    )
+    with schema.transaction():
+        for table in tables:
+            schema.execute_query(f"DELETE FROM {table['name']}")
+    return schema
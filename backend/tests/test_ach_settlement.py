@@ -0,0 +1,67 @@
+import json
+from datetime import date
+
+from models.loan import Loan
+from models.loan_application import LoanApplication
+from models.user import User
+from tasks import ach_processor
+
+BANK_ACCOUNT = {
+    'business_bank_account': {
+        'routing_number': '021000021',
+        'account_number': '123456789',
+        'account_holder_name': 'ACME LLC',
+    }
+}
+
+
+def create_loan(db, email, financial_info):
+    user_id = User().create_user(email, 'password')['id']
+    application = LoanApplication().create_application({'user_id': user_id, 'business_name': email, 'tax_id': '1'})
+    db.execute_query(
+        "UPDATE loan_applications SET financial_info = %s WHERE id = %s",
+        (json.dumps(financial_info), application['id'])
+    )
+    return Loan().create_loan({
+        'application_id': application['id'], 'user_id': user_id, 'business_name': email, 'tax_id': '1',
+        'amount': 1000, 'term_days': 10, 'interest_rate': 0, 'remaining_balance': 1000,
+    })['id']
+
+
+def test_entry_left_out_of_the_file_is_not_settled(db):
+    loan_model = Loan()
+    sent_loan = create_loan(db, 'sent@example.com', BANK_ACCOUNT)
+    skipped_loan = create_loan(db, 'skipped@example.com', {})
+    batch_date = date.fromisoformat(str(db.fetch_one("SELECT MIN(due_date) AS due_date FROM payments")['due_date'])[:10])
+
+    batch = loan_model.create_ach_batch(batch_date)
+    assert batch['total_transactions'] == 2
+
+    content = ach_processor.create_nacha_file_manually(batch['id'], batch_date, '0000001')
+    assert isinstance(content, str)
+    entries = [line for line in content.splitlines() if line.startswith('6')]
+    assert len(entries) == 1
+
+    skipped_payment = db.fetch_one(
+        "SELECT status, ach_batch_id FROM payments WHERE loan_id = %s AND due_date = %s", (skipped_loan, batch_date)
+    )
+    assert skipped_payment == {'status': 'scheduled', 'ach_batch_id': None}
+    assert loan_model.get_ach_batch(batch['id'])['total_transactions'] == 1
+
+    ach_processor.update_batch_file_name(batch['id'], 'ACH_test.txt')
+    assert 'error' not in loan_model.mark_ach_batch_sent(batch['id'])
+    result = loan_model.settle_ach_batch(batch['id'])
+    assert result['payments'] == 1
+
+    statuses = {
+        row['loan_id']: row['status']
+        for row in db.fetch_all("SELECT loan_id, status FROM payments WHERE due_date = %s", (batch_date,))
+    }
+    assert statuses == {sent_loan: 'completed', skipped_loan: 'scheduled'}
+    transactions = {
+        row['status']: row['failure_reason']
+        for row in db.fetch_all("SELECT status, failure_reason FROM ach_transactions WHERE batch_id = %s", (batch['id'],))
+    }
+    assert transactions == {'processed': None, 'failed': 'Incomplete bank information'}
+    ledger_loans = [row['loan_id'] for row in db.fetch_all("SELECT loan_id FROM loan_ledger")]
+    assert ledger_loans == [sent_loan]
@@ -0,0 +1,31 @@
+import pytest
+
+flask = pytest.importorskip('flask', exc_type=ImportError)
+pytest.importorskip('flask_jwt_extended', exc_type=ImportError)
+
+from flask_jwt_extended import JWTManager  # noqa: E402
+
+from models.user import User  # noqa: E402
+from routes.auth import auth_bp  # noqa: E402
+
+
+@pytest.fixture
+def client(db):
+    app = flask.Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'test-secret'
+    JWTManager(app)
+    app.register_blueprint(auth_bp, url_prefix='/api/v1/auth')
+    return app.test_client()
+
+
+def test_register_ignores_client_supplied_role(client):
+    response = client.post('/api/v1/auth/register', json={
+        'email': 'mallory@example.com',
+        'password': 'password',
+        'role': 'admin',
+    })
+
+    assert response.status_code == 201
+    user_id = response.get_json()['user']['id']
+    assert response.get_json()['user']['role'] == 'user'
+    assert User().get_role(user_id) == 'user'
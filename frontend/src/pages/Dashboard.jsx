@@ -19,7 +19,9 @@ const Dashboard = () => {
   const [loanApplications, setLoanApplications] = useState([]);
   const [activeLoans, setActiveLoans] = useState([]);
   const [upcomingPayments, setUpcomingPayments] = useState([]);
-  const [allUpcomingPayments, setAllUpcomingPayments] = useState([]);
+  const [upcomingTotal, setUpcomingTotal] = useState(0);
+  // Cursor de cada página ya visitada; paymentCursors[n] abre la página n + 1
+  const [paymentCursors, setPaymentCursors] = useState([null]);
   const [paymentsPage, setPaymentsPage] = useState(1);
   const [paymentsPerPage] = useState(10);
   const [summary, setSummary] = useState({
@@ -29,6 +31,14 @@ const Dashboard = () => {
     totalRejected: 0,
   });
 
+  // Una página de próximos pagos, los más cercanos primero
+  const fetchUpcomingPayments = (cursor) => PaymentService.getAll({
+    status: 'scheduled',
+    sort: 'due_date:asc',
+    limit: paymentsPerPage,
+    ...(cursor ? { cursor } : {})
+  });
+
   // Cargar datos al montar el componente
   useEffect(() => {
     const fetchData = async () => {
@@ -53,13 +63,13 @@ const Dashboard = () => {
 
         setActiveLoans(loansResponse.loans || []);
 
-        const paymentsResponse = await PaymentService.getAll({
-          status: 'scheduled',
-          sort: 'created_at:desc'
-        });
+        // Solo la primera página de próximos pagos; el total viene de la API
+        const paymentsResponse = await fetchUpcomingPayments(null);
 
-        setAllUpcomingPayments(paymentsResponse.payments || []);
-        setUpcomingPayments(paymentsResponse.payments?.slice(0, paymentsPerPage) || []);
+        setUpcomingPayments(paymentsResponse.payments || []);
+        setUpcomingTotal(paymentsResponse.total ?? (paymentsResponse.payments || []).length);
+        setPaymentCursors([null, paymentsResponse.next_cursor]);
+        setPaymentsPage(1);
 
         // Obtener resumen (esto sería un endpoint específico en tu API)
         setSummary({
@@ -81,18 +91,30 @@ const Dashboard = () => {
     fetchData();
   }, [paymentsPerPage]);
 
-  // Efecto para manejar cambios en la página de pagos
-  useEffect(() => {
-    const startIndex = (paymentsPage - 1) * paymentsPerPage;
-    const endIndex = startIndex + paymentsPerPage;
-    setUpcomingPayments(allUpcomingPayments.slice(startIndex, endIndex));
-  }, [paymentsPage, allUpcomingPayments, paymentsPerPage]);
-
-  // Función para cambiar de página
-  const handlePageChange = (newPage) => {
-    setPaymentsPage(newPage);
+  // Función para cambiar de página: pide a la API la página con su cursor
+  const handlePageChange = async (newPage) => {
+    const cursor = paymentCursors[newPage - 1];
+    if (newPage < 1 || (newPage > 1 && !cursor)) {
+      return;
+    }
+    try {
+      const paymentsResponse = await fetchUpcomingPayments(cursor);
+      setUpcomingPayments(paymentsResponse.payments || []);
+      setPaymentCursors((cursors) => {
+        const updated = cursors.slice(0, newPage);
+        updated[newPage] = paymentsResponse.next_cursor;
+        return updated;
+      });
+      setPaymentsPage(newPage);
+    } catch (err) {
+      setError('Error al cargar los pagos próximos');
+      console.error('Error fetching upcoming payments:', err);
+    }
   };
 
+  const paymentsTotalPages = Math.max(1, Math.ceil(upcomingTotal / paymentsPerPage));
+  const hasNextPaymentsPage = Boolean(paymentCursors[paymentsPage]);
+
   // Formatear fecha
   const formatDate = (dateString) => {
     return new Date(dateString).toLocaleDateString('es-ES', {
@@ -260,7 +282,7 @@ const Dashboard = () => {
                   </dt>
                   <dd>
                     <div className="text-lg font-medium text-gray-900">
-                      {allUpcomingPayments.length}
+                      {upcomingTotal}
                     </div>
                   </dd>
                 </dl>
@@ -457,7 +479,7 @@ const Dashboard = () => {
       
       {/* Pagos próximos */}
       <Card title="Pagos próximos">
-        {allUpcomingPayments.length === 0 ? (
+        {upcomingPayments.length === 0 ? (
           <div className="text-center py-4">
             <p className="text-gray-500">No tienes pagos próximos.</p>
           </div>
@@ -509,7 +531,7 @@ const Dashboard = () => {
             </table>
             
             {/* Paginación */}
-            {allUpcomingPayments.length > paymentsPerPage && (
+            {(paymentsPage > 1 || hasNextPaymentsPage) && (
               <div className="px-4 py-3 flex items-center justify-between border-t border-gray-200 sm:px-6">
                 <div className="flex-1 flex justify-between">
                   <button
@@ -521,12 +543,12 @@ const Dashboard = () => {
                     Anterior
                   </button>
                   <span className="text-sm text-gray-700">
-                    Página {paymentsPage} de {Math.ceil(allUpcomingPayments.length / paymentsPerPage)}
+                    Página {paymentsPage} de {paymentsTotalPages}
                   </span>
                   <button
                     onClick={() => handlePageChange(paymentsPage + 1)}
-                    disabled={paymentsPage >= Math.ceil(allUpcomingPayments.length / paymentsPerPage)}
-                    className={`relative inline-flex items-center px-4 py-2 border border-gray-300 text-sm font-medium rounded-md text-gray-700 bg-white ${paymentsPage >= Math.ceil(allUpcomingPayments.length / paymentsPerPage) ? 'opacity-50 cursor-not-allowed' : 'hover:bg-gray-50'}`}
+                    disabled={!hasNextPaymentsPage}
+                    className={`relative inline-flex items-center px-4 py-2 border border-gray-300 text-sm font-medium rounded-md text-gray-700 bg-white ${!hasNextPaymentsPage ? 'opacity-50 cursor-not-allowed' : 'hover:bg-gray-50'}`}
                   >
                     Siguiente
                     <FiChevronRight className="ml-2 h-5 w-5" />
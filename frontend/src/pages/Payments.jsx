@@ -11,7 +11,9 @@ const Payments = () => {
   const [payments, setPayments] = useState([]);
   const [paymentsPage, setPaymentsPage] = useState(1);
   const [paymentsPerPage] = useState(100);
-  const [paginatedPayments, setPaginatedPayments] = useState([]);
+  // Cursor con el que empieza cada página; la primera no tiene
+  const [pageCursors, setPageCursors] = useState([null]);
+  const [nextCursor, setNextCursor] = useState(null);
 
   useEffect(() => {
     const fetchPayments = async () => {
@@ -19,10 +21,17 @@ const Payments = () => {
         setLoading(true);
         setError('');
         
-        const response = await PaymentService.getAll({
-          sort: 'created_at:desc'
-        });
+        const params = {
+          sort: 'due_date:desc',
+          limit: paymentsPerPage
+        };
+        const cursor = pageCursors[paymentsPage - 1];
+        if (cursor) {
+          params.cursor = cursor;
+        }
+        const response = await PaymentService.getAll(params);
         setPayments(response.payments || []);
+        setNextCursor(response.next_cursor || null);
         setLoading(false);
         
       } catch (err) {
@@ -33,17 +42,13 @@ const Payments = () => {
     };
 
     fetchPayments();
-  }, []);
-
-  // Efecto para manejar cambios en la página de pagos
-  useEffect(() => {
-    const startIndex = (paymentsPage - 1) * paymentsPerPage;
-    const endIndex = startIndex + paymentsPerPage;
-    setPaginatedPayments(payments.slice(startIndex, endIndex));
-  }, [paymentsPage, payments, paymentsPerPage]);
+  }, [paymentsPage, pageCursors, paymentsPerPage]);
 
   // Función para cambiar de página
   const handlePageChange = (newPage) => {
+    if (newPage > paymentsPage && nextCursor && pageCursors.length < newPage) {
+      setPageCursors([...pageCursors, nextCursor]);
+    }
     setPaymentsPage(newPage);
   };
 
@@ -143,7 +148,7 @@ const Payments = () => {
                 </tr>
               </thead>
               <tbody className="bg-white divide-y divide-gray-200">
-                {paginatedPayments.map((payment) => (
+                {payments.map((payment) => (
                   <tr key={payment.id}>
                     <td className="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">
                       {payment.id}
@@ -169,7 +174,7 @@ const Payments = () => {
             </table>
             
             {/* Paginación */}
-            {payments.length > paymentsPerPage && (
+            {(paymentsPage > 1 || nextCursor) && (
               <div className="px-4 py-3 flex items-center justify-between border-t border-gray-200 sm:px-6">
                 <div className="flex-1 flex justify-between">
                   <button
@@ -181,12 +186,12 @@ const Payments = () => {
                     Anterior
                   </button>
                   <span className="text-sm text-gray-700">
-                    Página {paymentsPage} de {Math.ceil(payments.length / paymentsPerPage)}
+                    Página {paymentsPage}
                   </span>
                   <button
                     onClick={() => handlePageChange(paymentsPage + 1)}
-                    disabled={paymentsPage >= Math.ceil(payments.length / paymentsPerPage)}
-                    className={`relative inline-flex items-center px-4 py-2 border border-gray-300 text-sm font-medium rounded-md text-gray-700 bg-white ${paymentsPage >= Math.ceil(payments.length / paymentsPerPage) ? 'opacity-50 cursor-not-allowed' : 'hover:bg-gray-50'}`}
+                    disabled={!nextCursor}
+                    className={`relative inline-flex items-center px-4 py-2 border border-gray-300 text-sm font-medium rounded-md text-gray-700 bg-white ${!nextCursor ? 'opacity-50 cursor-not-allowed' : 'hover:bg-gray-50'}`}
                   >
                     Siguiente
                     <FiChevronRight className="ml-2 h-5 w-5" />